@@ -1,8 +1,10 @@
 """Audit Log API endpoints."""
-from typing import List, Optional
-from fastapi import APIRouter, Depends, Query
+import base64
+from datetime import datetime
+from typing import List, Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy import desc, select, tuple_
 
 from app.database import get_db
 from app.models import AuditLog
@@ -13,24 +15,63 @@ from app.schemas import UserInfo
 router = APIRouter()
 
 
+def encode_cursor(entry: AuditEntry) -> str:
+    """Encode an entry's (timestamp, log_id) position as an opaque cursor."""
+    raw = f"{entry.timestamp.isoformat()}|{entry.log_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode a cursor produced by encode_cursor."""
+    try:
+        timestamp, log_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(timestamp), int(log_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
 @router.get("", response_model=List[AuditEntry])
 def list_audit_entries(
+    response: Response,
     limit: int = Query(default=100, ge=1, le=1000),
+    before: Optional[str] = None,
     action: Optional[str] = None,
     user_email: Optional[str] = None,
     entity: Optional[str] = None,
     current_user: UserInfo = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """List audit log entries (requires authentication)."""
-    query = db.query(AuditLog).order_by(desc(AuditLog.timestamp))
+    """List audit log entries, newest first (requires authentication).
+
+    Pages are keyset-based: pass the X-Next-Cursor header of one page as
+    `before` to fetch the next.
+    """
+    # Select plain columns and build responses directly, skipping ORM
+    # identity-map bookkeeping and re-validation of DB-typed values
+    stmt = select(
+        AuditLog.log_id,
+        AuditLog.timestamp,
+        AuditLog.user_email,
+        AuditLog.action,
+        AuditLog.entity,
+        AuditLog.details,
+    ).order_by(desc(AuditLog.timestamp), desc(AuditLog.log_id))
 
+    if before:
+        stmt = stmt.where(
+            tuple_(AuditLog.timestamp, AuditLog.log_id) < decode_cursor(before)
+        )
     if action:
-        query = query.filter(AuditLog.action == action)
+        stmt = stmt.where(AuditLog.action == action)
     if user_email:
-        query = query.filter(AuditLog.user_email == user_email)
+        stmt = stmt.where(AuditLog.user_email == user_email)
     if entity:
-        query = query.filter(AuditLog.entity == entity)
+        stmt = stmt.where(AuditLog.entity == entity)
 
-    entries = query.limit(limit).all()
+    entries = [
+        AuditEntry.model_construct(**row)
+        for row in db.execute(stmt.limit(limit)).mappings()
+    ]
+    if len(entries) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(entries[-1])
     return entries
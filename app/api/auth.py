@@ -1,19 +1,17 @@
 """Authentication API endpoints."""
 from datetime import timedelta
 from fastapi import APIRouter, HTTPException, status, Depends
-from sqlalchemy.orm import Session
 
 from app.config import settings
-from app.database import get_db
 from app.schemas import TokenRequest, TokenResponse, UserInfo
 from app.auth import authenticate_user, create_access_token, get_current_user
-from app.models import AuditLog
+from app.audit_writer import enqueue_audit
 
 router = APIRouter()
 
 
 @router.post("/login", response_model=TokenResponse)
-def login(request: TokenRequest, db: Session = Depends(get_db)):
+def login(request: TokenRequest):
     """Authenticate user and return JWT token."""
     user = authenticate_user(request.email, request.password)
     if not user:
@@ -29,15 +27,13 @@ def login(request: TokenRequest, db: Session = Depends(get_db)):
         expires_delta=timedelta(minutes=settings.access_token_expire_minutes)
     )
 
-    # Log the login
-    audit_entry = AuditLog(
+    # Log the login (written in the background, off the request path)
+    enqueue_audit(
         user_email=user["email"],
         action="LOGIN",
         entity="auth",
         details=f"User {user['name']} logged in"
     )
-    db.add(audit_entry)
-    db.commit()
 
     return TokenResponse(
         access_token=access_token,
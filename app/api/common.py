@@ -0,0 +1,19 @@
+"""Helpers shared by the API endpoints."""
+from decimal import Decimal
+from sqlalchemy import func, case, type_coerce, Numeric
+
+
+def calculate_margin_percent(revenue: Decimal, cost: Decimal) -> Decimal:
+    """Calculate margin percentage safely."""
+    if not revenue or revenue == 0:
+        return Decimal("0")
+    return ((revenue - cost) / revenue * 100).quantize(Decimal("0.01"))
+
+
+def margin_percent_sql(revenue, cost):
+    """SQL counterpart of calculate_margin_percent for aggregate expressions."""
+    revenue = func.coalesce(revenue, 0)
+    return type_coerce(case(
+        (revenue == 0, 0),
+        else_=func.round((revenue - func.coalesce(cost, 0)) * 100.0 / revenue, 2)
+    ), Numeric(18, 2))
@@ -3,23 +3,19 @@ from decimal import Decimal
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from sqlalchemy import func, desc, null, select, Numeric
 
 from app.database import get_db
+from app.api.common import calculate_margin_percent, margin_percent_sql
+from app.cache import cached_result, get_latest_week
 from app.models import DimWeek, DimProduct, DimJob, FactRevenue, FactCosts, Direction
 from app.schemas import DrillProductGroup, DrillCategory, JobDetail
 
 router = APIRouter()
 
 
-def calculate_margin_percent(revenue: Decimal, cost: Decimal) -> Decimal:
-    """Calculate margin percentage safely."""
-    if not revenue or revenue == 0:
-        return Decimal("0")
-    return ((revenue - cost) / revenue * 100).quantize(Decimal("0.01"))
-
-
 @router.get("/product/{product_group}", response_model=DrillProductGroup)
+@cached_result("drill_product")
 def drill_to_product_group(
     product_group: str,
     week_id: Optional[int] = None,
@@ -30,18 +26,19 @@ def drill_to_product_group(
     if week_id:
         week = db.query(DimWeek).filter(DimWeek.week_id == week_id).first()
     else:
-        week = db.query(DimWeek).order_by(
-            desc(DimWeek.iso_year), desc(DimWeek.iso_week)
-        ).first()
+        week = get_latest_week(db)
 
     if not week:
         raise HTTPException(status_code=404, detail="No data available")
 
-    # Get revenue by category (outbound)
+    # Revenue by category (outbound) and cost by category, merged in one
+    # round-trip: UNION ALL the two aggregates and re-group by category.
     revenue_query = db.query(
-        DimProduct.category,
+        DimProduct.category.label("category"),
         func.sum(FactRevenue.revenue).label("revenue"),
-        func.count(func.distinct(FactRevenue.fact_id)).label("order_count")
+        func.count().label("order_count"),
+        null().label("cost"),
+        null().label("job_count")
     ).join(
         DimProduct, FactRevenue.product_id == DimProduct.product_id
     ).filter(
@@ -50,12 +47,10 @@ def drill_to_product_group(
         DimProduct.product_group == product_group
     ).group_by(DimProduct.category)
 
-    revenue_results = {r.category: {"revenue": r.revenue or Decimal("0"), "orders": r.order_count}
-                       for r in revenue_query.all()}
-
-    # Get costs by category
     cost_query = db.query(
-        DimProduct.category,
+        DimProduct.category.label("category"),
+        null().label("revenue"),
+        null().label("order_count"),
         func.sum(FactCosts.direct_labor + FactCosts.burden + FactCosts.material_cost).label("cost"),
         func.count(func.distinct(FactCosts.job_id)).label("job_count")
     ).join(
@@ -67,31 +62,35 @@ def drill_to_product_group(
         DimProduct.product_group == product_group
     ).group_by(DimProduct.category)
 
-    cost_results = {c.category: {"cost": c.cost or Decimal("0"), "jobs": c.job_count}
-                    for c in cost_query.all()}
+    combined = revenue_query.union_all(cost_query).subquery()
+    category_revenue = func.sum(combined.c.revenue)
+    category_cost = func.sum(combined.c.cost, type_=Numeric(18, 2))
+    category_query = db.query(
+        combined.c.category,
+        category_revenue.label("revenue"),
+        category_cost.label("cost"),
+        margin_percent_sql(category_revenue, category_cost).label("margin_percent"),
+        func.sum(combined.c.job_count).label("job_count")
+    ).group_by(combined.c.category).order_by(combined.c.category)
 
     # Build categories
-    all_categories = set(revenue_results.keys()) | set(cost_results.keys())
     categories = []
     total_revenue = Decimal("0")
     total_cost = Decimal("0")
 
-    for cat in sorted(all_categories):
-        rev_data = revenue_results.get(cat, {"revenue": Decimal("0"), "orders": 0})
-        cost_data = cost_results.get(cat, {"cost": Decimal("0"), "jobs": 0})
-
-        revenue = rev_data["revenue"]
-        cost = cost_data["cost"]
+    for row in category_query.all():
+        revenue = row.revenue or Decimal("0")
+        cost = row.cost or Decimal("0")
         margin = revenue - cost
-        margin_percent = calculate_margin_percent(revenue, cost)
 
-        categories.append(DrillCategory(
-            category=cat,
+        categories.append(DrillCategory.model_construct(
+            category=row.category,
             revenue=revenue,
             cost=cost,
             margin=margin,
-            margin_percent=margin_percent,
-            job_count=cost_data["jobs"]
+            # 0 (not 0.00) for zero revenue, as calculate_margin_percent returns
+            margin_percent=row.margin_percent if revenue else Decimal("0"),
+            job_count=row.job_count or 0
         ))
 
         total_revenue += revenue
@@ -111,6 +110,7 @@ def drill_to_product_group(
 
 
 @router.get("/category/{category}", response_model=List[JobDetail])
+@cached_result("drill_category")
 def drill_to_category(
     category: str,
     week_id: Optional[int] = None,
@@ -122,15 +122,14 @@ def drill_to_category(
     if week_id:
         week = db.query(DimWeek).filter(DimWeek.week_id == week_id).first()
     else:
-        week = db.query(DimWeek).order_by(
-            desc(DimWeek.iso_year), desc(DimWeek.iso_week)
-        ).first()
+        week = get_latest_week(db)
 
     if not week:
         return []
 
-    # Get jobs with costs in this category
-    jobs_query = db.query(
+    # Get jobs with costs in this category. Plain column rows (no ORM
+    # entities), so each mapping feeds JobDetail once its sums are filled in.
+    jobs_stmt = select(
         DimJob.job_id,
         DimJob.job_num,
         DimJob.sales_order_num,
@@ -139,53 +138,53 @@ def drill_to_category(
         DimProduct.category,
         func.sum(FactCosts.direct_labor).label("direct_labor"),
         func.sum(FactCosts.burden).label("burden"),
-        func.sum(FactCosts.material_cost).label("material_cost")
+        func.sum(FactCosts.material_cost).label("material_cost"),
+        func.sum(FactCosts.direct_labor + FactCosts.burden + FactCosts.material_cost).label("total_cost")
     ).join(
         DimJob, FactCosts.job_id == DimJob.job_id
     ).join(
         DimProduct, DimJob.product_id == DimProduct.product_id
-    ).filter(
+    ).where(
         FactCosts.week_id == week.week_id,
         DimProduct.category == category
     ).group_by(
         DimJob.job_id, DimJob.job_num, DimJob.sales_order_num, DimJob.part_num,
         DimProduct.product_group, DimProduct.category
     ).order_by(
-        desc(func.sum(FactCosts.direct_labor + FactCosts.burden + FactCosts.material_cost))
+        desc("total_cost")
     ).limit(limit)
 
     jobs = []
-    for row in jobs_query.all():
-        labor = row.direct_labor or Decimal("0")
-        burden = row.burden or Decimal("0")
-        material = row.material_cost or Decimal("0")
-        total_cost = labor + burden + material
-
-        jobs.append(JobDetail(
-            job_id=row.job_id,
-            job_num=row.job_num,
-            sales_order_num=row.sales_order_num,
-            part_num=row.part_num,
-            direct_labor=labor,
-            burden=burden,
-            material_cost=material,
-            total_cost=total_cost,
-            product_group=row.product_group,
-            category=row.category
-        ))
+    for row in db.execute(jobs_stmt).mappings():
+        job = dict(row)
+        for column in ("direct_labor", "burden", "material_cost", "total_cost"):
+            # Zero sums report 0 (not 0.00), as in drill_to_job
+            job[column] = job[column] or Decimal("0")
+        jobs.append(JobDetail(**job))
 
     return jobs
 
 
 @router.get("/job/{job_num}", response_model=JobDetail)
+@cached_result("drill_job")
 def drill_to_job(
     job_num: str,
     week_id: Optional[int] = None,
     db: Session = Depends(get_db)
 ):
     """Get detailed information for a specific job."""
-    # Find the job
-    job = db.query(DimJob).filter(DimJob.job_num == job_num).first()
+    # Find the job, with its product group/category in the same row
+    job = db.query(
+        DimJob.job_id,
+        DimJob.job_num,
+        DimJob.sales_order_num,
+        DimJob.part_num,
+        DimJob.product_id,
+        DimProduct.product_group,
+        DimProduct.category
+    ).outerjoin(
+        DimProduct, DimJob.product_id == DimProduct.product_id
+    ).filter(DimJob.job_num == job_num).first()
     if not job:
         raise HTTPException(status_code=404, detail=f"Job {job_num} not found")
 
@@ -215,34 +214,23 @@ def drill_to_job(
     costs = db.query(
         func.sum(FactCosts.direct_labor).label("direct_labor"),
         func.sum(FactCosts.burden).label("burden"),
-        func.sum(FactCosts.material_cost).label("material_cost")
+        func.sum(FactCosts.material_cost).label("material_cost"),
+        func.sum(FactCosts.direct_labor + FactCosts.burden + FactCosts.material_cost).label("total_cost")
     ).filter(
         FactCosts.job_id == job.job_id,
         FactCosts.week_id == week.week_id
     ).first()
 
-    labor = costs.direct_labor or Decimal("0")
-    burden = costs.burden or Decimal("0")
-    material = costs.material_cost or Decimal("0")
-    total_cost = labor + burden + material
-
-    # Get product info
-    product_group = None
-    category = None
-    if job.product:
-        product_group = job.product.product_group
-        category = job.product.category
-
     return JobDetail(
         job_id=job.job_id,
         job_num=job.job_num,
         sales_order_num=job.sales_order_num,
         part_num=job.part_num,
         product_id=job.product_id,
-        direct_labor=labor,
-        burden=burden,
-        material_cost=material,
-        total_cost=total_cost,
-        product_group=product_group,
-        category=category
+        direct_labor=costs.direct_labor or Decimal("0"),
+        burden=costs.burden or Decimal("0"),
+        material_cost=costs.material_cost or Decimal("0"),
+        total_cost=costs.total_cost or Decimal("0"),
+        product_group=job.product_group,
+        category=job.category
     )
@@ -8,9 +8,10 @@ from decimal import Decimal
 from typing import List, Optional, Literal
 from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from sqlalchemy import func, desc, select
 
 from app.database import get_db
+from app.cache import get_latest_week
 from app.models import DimWeek, DimJob, DimProduct, FactCosts
 from app.schemas import LaborSummary, LaborByJob, WeekSummary
 
@@ -29,9 +30,7 @@ def get_labor_summary(
     if week_id:
         week = db.query(DimWeek).filter(DimWeek.week_id == week_id).first()
     else:
-        week = db.query(DimWeek).order_by(
-            desc(DimWeek.iso_year), desc(DimWeek.iso_week)
-        ).first()
+        week = get_latest_week(db)
 
     if not week:
         return LaborSummary(
@@ -45,25 +44,8 @@ def get_labor_summary(
             by_job=[]
         )
 
-    # Get totals including hours
-    totals = db.query(
-        func.sum(FactCosts.labor_hours).label("total_labor_hours"),
-        func.sum(FactCosts.burden_hours).label("total_burden_hours"),
-        func.sum(FactCosts.direct_labor).label("total_labor"),
-        func.sum(FactCosts.burden).label("total_burden"),
-        func.count(func.distinct(FactCosts.job_id)).label("job_count")
-    ).filter(
-        FactCosts.week_id == week.week_id
-    ).first()
-
-    total_labor_hours = totals.total_labor_hours or Decimal("0")
-    total_burden_hours = totals.total_burden_hours or Decimal("0")
-    total_direct_labor = totals.total_labor or Decimal("0")
-    total_burden = totals.total_burden or Decimal("0")
-    job_count = totals.job_count or 0
-
     # Get by job with product group, job status, and hours
-    job_query = db.query(
+    job_stmt = select(
         DimJob.job_num,
         DimJob.sales_order_num,
         DimJob.job_closed,
@@ -71,34 +53,61 @@ def get_labor_summary(
         func.sum(FactCosts.labor_hours).label("labor_hours"),
         func.sum(FactCosts.burden_hours).label("burden_hours"),
         func.sum(FactCosts.direct_labor).label("direct_labor"),
-        func.sum(FactCosts.burden).label("burden")
+        func.sum(FactCosts.burden).label("burden"),
+        func.sum(FactCosts.direct_labor + FactCosts.burden).label("total_labor")
     ).join(
         DimJob, FactCosts.job_id == DimJob.job_id
     ).outerjoin(
         DimProduct, DimJob.product_id == DimProduct.product_id
-    ).filter(
+    ).where(
         FactCosts.week_id == week.week_id
     )
 
     # Apply status filter (maps to JobAsmbl_JobComplete)
     if status == "wip":
-        job_query = job_query.filter(DimJob.job_closed == False)
+        job_stmt = job_stmt.where(DimJob.job_closed == False)
     elif status == "completed":
-        job_query = job_query.filter(DimJob.job_closed == True)
+        job_stmt = job_stmt.where(DimJob.job_closed == True)
 
-    job_query = job_query.group_by(
+    job_stmt = job_stmt.group_by(
         DimJob.job_num, DimJob.sales_order_num, DimJob.job_closed, DimProduct.product_group
+    )
+
+    # Totals over all matching jobs (before the limit) ride along on each
+    # row as window aggregates, so the page and totals come back together
+    jobs = job_stmt.subquery()
+    page_stmt = select(
+        jobs,
+        func.sum(jobs.c.labor_hours).over().label("total_labor_hours"),
+        func.sum(jobs.c.burden_hours).over().label("total_burden_hours"),
+        func.sum(jobs.c.direct_labor).over().label("total_direct_labor"),
+        func.sum(jobs.c.burden).over().label("total_burden"),
+        func.count().over().label("job_count")
     ).order_by(
-        desc(func.sum(FactCosts.direct_labor + FactCosts.burden))
+        desc(jobs.c.total_labor)
     ).limit(limit)
 
+    rows = db.execute(page_stmt).all()
+
+    total_labor_hours = Decimal("0")
+    total_burden_hours = Decimal("0")
+    total_direct_labor = Decimal("0")
+    total_burden = Decimal("0")
+    job_count = 0
+    if rows:
+        total_labor_hours = rows[0].total_labor_hours or Decimal("0")
+        total_burden_hours = rows[0].total_burden_hours or Decimal("0")
+        total_direct_labor = rows[0].total_direct_labor or Decimal("0")
+        total_burden = rows[0].total_burden or Decimal("0")
+        job_count = rows[0].job_count
+
     by_job = []
-    for row in job_query.all():
+    for row in rows:
         labor_hrs = row.labor_hours or Decimal("0")
         burden_hrs = row.burden_hours or Decimal("0")
         labor = row.direct_labor or Decimal("0")
         burden = row.burden or Decimal("0")
-        by_job.append(LaborByJob(
+        by_job.append(LaborByJob.model_construct(
             job_num=row.job_num,
             sales_order_num=row.sales_order_num,
             product_group=row.product_group,
@@ -1,11 +1,15 @@
 """Gross Margin API endpoints."""
 from decimal import Decimal
+from itertools import groupby
+from operator import attrgetter
 from typing import List, Optional
 from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from sqlalchemy import func, desc, literal, null, Numeric
 
 from app.database import get_db
+from app.api.common import calculate_margin_percent, margin_percent_sql
+from app.cache import get_latest_week
 from app.models import DimWeek, DimProduct, DimJob, FactRevenue, FactCosts, Direction
 from app.schemas import (
     MarginSummary, MarginByProduct, MarginTrend, WeekSummary
@@ -14,13 +18,6 @@ from app.schemas import (
 router = APIRouter()
 
 
-def calculate_margin_percent(revenue: Decimal, cost: Decimal) -> Decimal:
-    """Calculate margin percentage safely."""
-    if not revenue or revenue == 0:
-        return Decimal("0")
-    return ((revenue - cost) / revenue * 100).quantize(Decimal("0.01"))
-
-
 @router.get("", response_model=MarginSummary)
 def get_margin_summary(
     week_id: Optional[int] = None,
@@ -32,9 +29,7 @@ def get_margin_summary(
     if week_id:
         week = db.query(DimWeek).filter(DimWeek.week_id == week_id).first()
     else:
-        week = db.query(DimWeek).order_by(
-            desc(DimWeek.iso_year), desc(DimWeek.iso_week)
-        ).first()
+        week = get_latest_week(db)
 
     if not week:
         return MarginSummary(
@@ -46,11 +41,14 @@ def get_margin_summary(
             overall_margin_percent=Decimal("0")
         )
 
-    # Get revenue by product group (outbound only for margin)
+    # Revenue by product group (outbound only for margin) and costs by
+    # product group (via job -> product mapping), fetched together: the two
+    # aggregates are UNION ALL'd and re-grouped by product group
     revenue_query = db.query(
-        DimProduct.product_group,
+        DimProduct.product_group.label("product_group"),
         func.sum(FactRevenue.revenue).label("revenue"),
-        func.avg(DimProduct.target_margin).label("target_margin")
+        func.avg(DimProduct.target_margin).label("target_margin"),
+        null().label("total_cost")
     ).join(
         DimProduct, FactRevenue.product_id == DimProduct.product_id
     ).filter(
@@ -58,15 +56,10 @@ def get_margin_summary(
         FactRevenue.direction == Direction.OUTBOUND
     )
 
-    if product_group:
-        revenue_query = revenue_query.filter(DimProduct.product_group == product_group)
-
-    revenue_query = revenue_query.group_by(DimProduct.product_group)
-    revenue_results = {r.product_group: r for r in revenue_query.all()}
-
-    # Get costs by product group (via job -> product mapping)
     cost_query = db.query(
-        DimProduct.product_group,
+        DimProduct.product_group.label("product_group"),
+        null().label("revenue"),
+        null().label("target_margin"),
         func.sum(FactCosts.direct_labor + FactCosts.burden + FactCosts.material_cost).label("total_cost")
     ).join(
         DimJob, FactCosts.job_id == DimJob.job_id
@@ -77,34 +70,47 @@ def get_margin_summary(
     )
 
     if product_group:
+        revenue_query = revenue_query.filter(DimProduct.product_group == product_group)
         cost_query = cost_query.filter(DimProduct.product_group == product_group)
 
-    cost_query = cost_query.group_by(DimProduct.product_group)
-    cost_results = {c.product_group: c.total_cost or Decimal("0") for c in cost_query.all()}
+    combined = revenue_query.group_by(DimProduct.product_group).union_all(
+        cost_query.group_by(DimProduct.product_group)
+    ).subquery()
+    group_revenue = func.sum(combined.c.revenue)
+    group_cost = func.sum(combined.c.total_cost, type_=Numeric(18, 2))
+    group_query = db.query(
+        combined.c.product_group,
+        group_revenue.label("revenue"),
+        func.max(combined.c.target_margin).label("target_margin"),
+        group_cost.label("total_cost"),
+        margin_percent_sql(group_revenue, group_cost).label("margin_percent")
+    ).group_by(combined.c.product_group).order_by(combined.c.product_group)
 
     # Build response
     by_product = []
     total_revenue = Decimal("0")
     total_cost = Decimal("0")
 
-    all_groups = set(revenue_results.keys()) | set(cost_results.keys())
-
-    for group in sorted(all_groups):
-        rev_data = revenue_results.get(group)
-        revenue = rev_data.revenue if rev_data else Decimal("0")
-        target_margin = rev_data.target_margin if rev_data else None
-        cost = cost_results.get(group, Decimal("0"))
+    for row in group_query.all():
+        # Groups with costs but no revenue rows get 0; a zero revenue sum
+        # keeps its 0.00, as when revenue and costs were fetched separately
+        revenue = row.revenue if row.revenue is not None else Decimal("0")
+        target_margin = row.target_margin
+        cost = row.total_cost or Decimal("0")
 
         gross_margin = revenue - cost
-        margin_percent = calculate_margin_percent(revenue, cost)
+        # Zero revenue reports 0 rather than the SQL path's 0.00, as
+        # calculate_margin_percent does
+        margin_percent = row.margin_percent if revenue else Decimal("0")
 
         variance = None
         if target_margin is not None:
-            target_pct = Decimal(str(target_margin)) * 100
-            variance = margin_percent - target_pct
+            # AVG() comes back as a float
+            target_margin = Decimal(str(target_margin))
+            variance = margin_percent - target_margin * 100
 
-        by_product.append(MarginByProduct(
-            product_group=group,
+        by_product.append(MarginByProduct.model_construct(
+            product_group=row.product_group,
             revenue=revenue,
             total_cost=cost,
             gross_margin=gross_margin,
@@ -149,18 +155,66 @@ def get_margin_trend(
     if not recent_weeks:
         return []
 
+    week_ids = [w.week_id for w in recent_weeks]
+
+    # Revenue and cost per week for the whole range (outbound only for margin),
+    # tagged by kind and fetched in one UNION ALL ordered by week
+    revenue_query = db.query(
+        literal("revenue").label("kind"),
+        FactRevenue.week_id.label("week_id"),
+        func.sum(FactRevenue.revenue).label("amount")
+    ).join(
+        DimProduct, FactRevenue.product_id == DimProduct.product_id
+    ).filter(
+        FactRevenue.week_id.in_(week_ids),
+        FactRevenue.direction == Direction.OUTBOUND
+    )
+
+    cost_query = db.query(
+        literal("cost").label("kind"),
+        FactCosts.week_id.label("week_id"),
+        func.sum(FactCosts.direct_labor + FactCosts.burden + FactCosts.material_cost).label("amount")
+    ).join(
+        DimJob, FactCosts.job_id == DimJob.job_id
+    ).join(
+        DimProduct, DimJob.product_id == DimProduct.product_id
+    ).filter(
+        FactCosts.week_id.in_(week_ids)
+    )
+
+    if product_group:
+        revenue_query = revenue_query.filter(DimProduct.product_group == product_group)
+        cost_query = cost_query.filter(DimProduct.product_group == product_group)
+
+    combined = revenue_query.group_by(FactRevenue.week_id).union_all(
+        cost_query.group_by(FactCosts.week_id)
+    ).subquery()
+    rows = db.query(
+        combined.c.kind, combined.c.week_id, combined.c.amount
+    ).order_by(combined.c.week_id)
+
+    totals_by_week = {}
+    for week_id, week_rows in groupby(rows, key=attrgetter("week_id")):
+        revenue = cost = Decimal("0")
+        for row in week_rows:
+            if row.kind == "revenue":
+                revenue = row.amount or Decimal("0")
+            else:
+                cost = row.amount or Decimal("0")
+        totals_by_week[week_id] = (revenue, cost)
+
     trend = []
     for week in reversed(recent_weeks):  # Oldest first for charting
-        summary = get_margin_summary(week_id=week.week_id, product_group=product_group, db=db)
-        trend.append(MarginTrend(
+        revenue, cost = totals_by_week.get(week.week_id, (Decimal("0"), Decimal("0")))
+        trend.append(MarginTrend.model_construct(
             week_id=week.week_id,
             iso_year=week.iso_year,
             iso_week=week.iso_week,
             label=f"{week.iso_year}-W{week.iso_week:02d}",
-            revenue=summary.total_revenue,
-            total_cost=summary.total_cost,
-            gross_margin=summary.overall_margin,
-            margin_percent=summary.overall_margin_percent
+            revenue=revenue,
+            total_cost=cost,
+            gross_margin=revenue - cost,
+            margin_percent=calculate_margin_percent(revenue, cost)
         ))
 
     return trend
@@ -3,9 +3,10 @@ from decimal import Decimal
 from typing import List, Optional
 from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from sqlalchemy import func, desc, case
 
 from app.database import get_db
+from app.cache import get_latest_week
 from app.models import DimWeek, DimProduct, FactRevenue, Direction
 from app.schemas import (
     RevenueSummary, RevenueByProduct, RevenueByWeek,
@@ -26,9 +27,7 @@ def get_revenue_summary(
     if week_id:
         week = db.query(DimWeek).filter(DimWeek.week_id == week_id).first()
     else:
-        week = db.query(DimWeek).order_by(
-            desc(DimWeek.iso_year), desc(DimWeek.iso_week)
-        ).first()
+        week = get_latest_week(db)
 
     if not week:
         return RevenueSummary(
@@ -123,52 +122,41 @@ def get_revenue_trend(
 
     week_ids = [w.week_id for w in recent_weeks]
 
-    # Query revenue by week
+    # Query revenue by week, inbound and outbound folded into one row
+    inbound = func.sum(case(
+        (FactRevenue.direction == Direction.INBOUND, FactRevenue.revenue), else_=0
+    ))
+    outbound = func.sum(case(
+        (FactRevenue.direction == Direction.OUTBOUND, FactRevenue.revenue), else_=0
+    ))
     query = db.query(
         DimWeek.week_id,
         DimWeek.iso_year,
         DimWeek.iso_week,
-        FactRevenue.direction,
-        func.sum(FactRevenue.revenue).label("revenue")
+        inbound.label("inbound"),
+        outbound.label("outbound")
     ).join(
         DimWeek, FactRevenue.week_id == DimWeek.week_id
     ).filter(
         FactRevenue.week_id.in_(week_ids)
     ).group_by(
-        DimWeek.week_id, DimWeek.iso_year, DimWeek.iso_week, FactRevenue.direction
+        DimWeek.week_id, DimWeek.iso_year, DimWeek.iso_week
     ).order_by(
         DimWeek.iso_year, DimWeek.iso_week
     )
 
-    results = query.all()
-
-    # Aggregate by week
-    week_data = {}
-    for row in results:
-        key = row.week_id
-        if key not in week_data:
-            week_data[key] = {
-                "week_id": row.week_id,
-                "iso_year": row.iso_year,
-                "iso_week": row.iso_week,
-                "inbound": Decimal("0"),
-                "outbound": Decimal("0")
-            }
-        if row.direction == Direction.INBOUND:
-            week_data[key]["inbound"] = row.revenue or Decimal("0")
-        else:
-            week_data[key]["outbound"] = row.revenue or Decimal("0")
-
     # Build response
     trend = []
-    for data in sorted(week_data.values(), key=lambda x: (x["iso_year"], x["iso_week"])):
-        trend.append(RevenueByWeek(
-            week_id=data["week_id"],
-            iso_year=data["iso_year"],
-            iso_week=data["iso_week"],
-            inbound_revenue=data["inbound"],
-            outbound_revenue=data["outbound"],
-            total_revenue=data["inbound"] + data["outbound"]
+    for row in query.all():
+        inbound_revenue = row.inbound or Decimal("0")
+        outbound_revenue = row.outbound or Decimal("0")
+        trend.append(RevenueByWeek.model_construct(
+            week_id=row.week_id,
+            iso_year=row.iso_year,
+            iso_week=row.iso_week,
+            inbound_revenue=inbound_revenue,
+            outbound_revenue=outbound_revenue,
+            total_revenue=inbound_revenue + outbound_revenue
         ))
 
     return trend
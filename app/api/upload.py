@@ -1,26 +1,77 @@
 """File Upload API - Upload Excel/CSV files from Epicor BAQ exports."""
+from __future__ import annotations
 
-import io
-import pandas as pd
+from itertools import chain
 from pathlib import Path
-from typing import Optional
+from typing import TYPE_CHECKING, Iterable, Iterator, Optional
 from fastapi import APIRouter, Depends, File, Form, UploadFile, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
 from app.database import get_db
 from app.auth import get_current_user
 from app.schemas import UserInfo
 
-# ETL functions
-from app.etl.transform import (
-    aggregate_revenue_by_week,
-    aggregate_labor_by_week,
-    aggregate_material_by_week,
-)
-from app.etl.loader import load_revenue, load_costs
+# pandas and the ETL modules are imported where they're used, so the app
+# (and endpoints like /columns) start without loading pandas/numpy
+if TYPE_CHECKING:
+    import pandas as pd
 
 router = APIRouter()
 
+# Epicor BAQ column names mapped to the names the ETL transforms expect
+REVENUE_COLUMN_MAPPING = {
+    "Order_OrderNum": "OrderNum",
+    "OrderHed_OrderNum": "OrderNum",
+    "Order_OrderDate": "OrderDate",
+    "OrderHed_OrderDate": "OrderDate",
+    "Part_PartNum": "PartNum",
+    "OrderDtl_PartNum": "PartNum",
+    "Part_ProdCode": "ProdCode",
+    "OrderDtl_ProdCode": "ProdCode",
+    "Part_PartClass": "PartClass",
+    "OrderDtl_DocExtPriceDtl": "DocExtPrice",
+    "OrderHed_OpenOrder": "OpenOrder",
+}
+
+LABOR_COLUMN_MAPPING = {
+    "LaborDtl_JobNum": "JobNum",
+    "LaborDtl_ClockInDate": "LaborDate",
+    "LaborDtl_ResourceGrpID": "ResourceGrp",
+    "LaborDtl_LaborHrs": "LaborHrs",
+    "LaborDtl_BurdenHrs": "BurdenHrs",
+}
+
+JOB_COLUMN_MAPPING = {
+    "JobHead_JobNum": "JobNum",
+    "JobHead_OrderNum": "OrderNum",
+    "JobHead_PartNum": "PartNum",
+    "Part_ProdCode": "ProdCode",
+}
+
+MATERIAL_COLUMN_MAPPING = {
+    "JobMtl_JobNum": "JobNum",
+    "JobMtl_IssueDate": "IssueDate",
+    "JobMtl_ExtCost": "ExtCost",
+}
+
+# Columns each upload type must contain after mapping
+REVENUE_REQUIRED_COLUMNS = ("DocExtPrice",)
+LABOR_REQUIRED_COLUMNS = ("JobNum", "LaborHrs")
+JOB_REQUIRED_COLUMNS = ("JobNum",)
+MATERIAL_REQUIRED_COLUMNS = ("JobNum", "ExtCost")
+
+# Identifier columns kept as text when streaming CSV uploads, so every chunk
+# parses them the same way (per-chunk type inference could read a job number
+# as int in one chunk and str in the next, splitting its group). Values are
+# kept verbatim, e.g. "024004", matching the job numbers the Epicor ETL stores
+TEXT_KEY_COLUMNS = {"OrderNum", "JobNum", "ProdCode", "PartClass"}
+TEXT_KEY_DTYPES = dict.fromkeys(TEXT_KEY_COLUMNS, object)
+for _mapping in (REVENUE_COLUMN_MAPPING, LABOR_COLUMN_MAPPING, JOB_COLUMN_MAPPING, MATERIAL_COLUMN_MAPPING):
+    TEXT_KEY_DTYPES.update(
+        (column, object) for column, target in _mapping.items() if target in TEXT_KEY_COLUMNS
+    )
+
 
 @router.post("")
 async def upload_file(
@@ -58,20 +109,17 @@ async def upload_file(
         )
 
     try:
-        # Read file content
-        content = await file.read()
-
-        # Load into DataFrame
-        if suffix == ".csv":
-            df = pd.read_csv(io.BytesIO(content))
-        else:
-            df = pd.read_excel(io.BytesIO(content))
+        # Parsing and loading are blocking, so they run in the threadpool
+        # to keep the event loop free for other requests. CSV uploads are
+        # streamed in chunks; the first one is read here for its columns.
+        chunks = await run_in_threadpool(read_upload, file.file, suffix)
+        first = await run_in_threadpool(next, chunks, None)
 
-        if df.empty:
+        if first is None or first.empty:
             raise HTTPException(status_code=400, detail="File is empty")
 
         # Log available columns for debugging
-        columns = list(df.columns)
+        columns = list(first.columns)
 
         # Process based on file type
         result = {
@@ -79,61 +127,95 @@ async def upload_file(
             "file_type": file_type,
             "filename": filename,
             "columns_found": columns,
-            "rows_in_file": len(df),
+            "rows_in_file": 0,
             "rows_processed": 0,
             "message": "",
         }
 
-        if file_type == "revenue":
-            result = process_revenue(df, db, current_user.email, result)
-        elif file_type == "labor":
-            result = process_labor(df, db, current_user.email, result)
-        elif file_type == "jobs":
-            result = process_jobs(df, db, current_user.email, result)
-        elif file_type == "material":
-            result = process_material(df, db, current_user.email, result)
-
-        return result
+        processors = {
+            "revenue": process_revenue,
+            "labor": process_labor,
+            "jobs": process_jobs,
+            "material": process_material,
+        }
+        return await run_in_threadpool(
+            process_chunks, processors[file_type], chain([first], chunks), db, current_user.email, result
+        )
 
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
+    finally:
+        await file.close()
 
 
-def process_revenue(
-    df: pd.DataFrame, db: Session, user_email: str, result: dict
-) -> dict:
-    """Process revenue upload."""
-    # Try to map columns
-    column_mapping = {
-        "Order_OrderNum": "OrderNum",
-        "OrderHed_OrderNum": "OrderNum",
-        "Order_OrderDate": "OrderDate",
-        "OrderHed_OrderDate": "OrderDate",
-        "Part_PartNum": "PartNum",
-        "OrderDtl_PartNum": "PartNum",
-        "Part_ProdCode": "ProdCode",
-        "OrderDtl_ProdCode": "ProdCode",
-        "Part_PartClass": "PartClass",
-        "OrderDtl_DocExtPriceDtl": "DocExtPrice",
-        "OrderHed_OpenOrder": "OpenOrder",
-    }
-    df = df.rename(columns=column_mapping)
+def read_upload(upload, suffix: str) -> Iterator[pd.DataFrame]:
+    """Parse an uploaded file straight from its spooled temporary file.
 
-    # Check for required columns
-    required = ["DocExtPrice"]
-    missing = [c for c in required if c not in df.columns]
+    CSV files are streamed in chunks of CSV_CHUNK_ROWS rows so peak memory
+    stays bounded; Excel workbooks are read whole, as a single chunk.
+    """
+    import pandas as pd
+    from app.etl.ingest import CSV_CHUNK_ROWS, detect_format
+
+    upload.seek(0)
+    header = upload.read(8)
+    upload.seek(0)
+    if detect_format(header, suffix) == "csv":
+        return iter(pd.read_csv(upload, chunksize=CSV_CHUNK_ROWS, dtype=TEXT_KEY_DTYPES))
+    return iter([pd.read_excel(upload)])
+
+
+def process_chunks(processor, chunks: Iterable[pd.DataFrame], db: Session, user_email: str, result: dict) -> dict:
+    """Run a processor over streamed chunks, counting rows as they are read."""
+    def counted():
+        for chunk in chunks:
+            result["rows_in_file"] += len(chunk)
+            yield chunk
+
+    rows = counted()
+    result = processor(rows, db, user_email, result)
+    # Finish counting if the processor stopped early (e.g. missing columns)
+    for _ in rows:
+        pass
+    return result
+
+
+def map_columns(chunks: Iterable[pd.DataFrame], mapping: dict) -> Iterator[pd.DataFrame]:
+    """Map Epicor column names in place (touches only the column index)."""
+    for chunk in chunks:
+        chunk.columns = [mapping.get(c, c) for c in chunk.columns]
+        yield chunk
+
+
+def missing_columns(result: dict, mapping: dict, required: Iterable[str]) -> bool:
+    """Record a failed result if required columns are absent after mapping."""
+    mapped = [mapping.get(c, c) for c in result["columns_found"]]
+    found = set(mapped)
+    missing = [c for c in required if c not in found]
     if missing:
         result["success"] = False
         result["message"] = (
-            f"Missing required columns: {missing}. Found: {list(df.columns)}"
+            f"Missing required columns: {missing}. Found: {mapped}"
         )
+    return bool(missing)
+
+
+def process_revenue(
+    chunks: Iterable[pd.DataFrame], db: Session, user_email: str, result: dict
+) -> dict:
+    """Process revenue upload."""
+    from app.etl.transform import aggregate_revenue_by_week
+    from app.etl.loader import load_revenue
+
+    # Check for required columns
+    if missing_columns(result, REVENUE_COLUMN_MAPPING, REVENUE_REQUIRED_COLUMNS):
         return result
 
     # Aggregate by week
     try:
-        aggregated = aggregate_revenue_by_week(df)
+        aggregated = aggregate_revenue_by_week(map_columns(chunks, REVENUE_COLUMN_MAPPING))
         rows = load_revenue(db, aggregated, user_email=user_email)
         result["rows_processed"] = rows
         result["message"] = f"Successfully loaded {rows} revenue records"
@@ -144,31 +226,18 @@ def process_revenue(
     return result
 
 
-def process_labor(df: pd.DataFrame, db: Session, user_email: str, result: dict) -> dict:
+def process_labor(chunks: Iterable[pd.DataFrame], db: Session, user_email: str, result: dict) -> dict:
     """Process labor upload."""
-    # Try to map columns
-    column_mapping = {
-        "LaborDtl_JobNum": "JobNum",
-        "LaborDtl_ClockInDate": "LaborDate",
-        "LaborDtl_ResourceGrpID": "ResourceGrp",
-        "LaborDtl_LaborHrs": "LaborHrs",
-        "LaborDtl_BurdenHrs": "BurdenHrs",
-    }
-    df = df.rename(columns=column_mapping)
+    from app.etl.transform import aggregate_labor_by_week
+    from app.etl.loader import load_costs
 
     # Check for required columns
-    required = ["JobNum", "LaborHrs"]
-    missing = [c for c in required if c not in df.columns]
-    if missing:
-        result["success"] = False
-        result["message"] = (
-            f"Missing required columns: {missing}. Found: {list(df.columns)}"
-        )
+    if missing_columns(result, LABOR_COLUMN_MAPPING, LABOR_REQUIRED_COLUMNS):
         return result
 
     # Aggregate by week
     try:
-        aggregated = aggregate_labor_by_week(df)
+        aggregated = aggregate_labor_by_week(map_columns(chunks, LABOR_COLUMN_MAPPING))
         rows = load_costs(db, aggregated, user_email=user_email)
         result["rows_processed"] = rows
         result["message"] = f"Successfully loaded {rows} labor records"
@@ -179,29 +248,17 @@ def process_labor(df: pd.DataFrame, db: Session, user_email: str, result: dict)
     return result
 
 
-def process_jobs(df: pd.DataFrame, db: Session, user_email: str, result: dict) -> dict:
+def process_jobs(chunks: Iterable[pd.DataFrame], db: Session, user_email: str, result: dict) -> dict:
     """Process jobs upload - updates job dimension table."""
-    # Try to map columns
-    column_mapping = {
-        "JobHead_JobNum": "JobNum",
-        "JobHead_OrderNum": "OrderNum",
-        "JobHead_PartNum": "PartNum",
-        "Part_ProdCode": "ProdCode",
-    }
-    df = df.rename(columns=column_mapping)
-
     # Check for required columns
-    if "JobNum" not in df.columns:
-        result["success"] = False
-        result["message"] = (
-            f"Missing required column: JobNum. Found: {list(df.columns)}"
-        )
+    if missing_columns(result, JOB_COLUMN_MAPPING, JOB_REQUIRED_COLUMNS):
         return result
 
     # Store job info for later use
-    result["rows_processed"] = len(df)
+    jobs = sum(len(chunk) for chunk in chunks)
+    result["rows_processed"] = jobs
     result["message"] = (
-        f"Found {len(df)} jobs. Job data is used when processing labor uploads."
+        f"Found {jobs} jobs. Job data is used when processing labor uploads."
     )
     result["note"] = "Upload labor file after jobs to link job details."
 
@@ -209,30 +266,18 @@ def process_jobs(df: pd.DataFrame, db: Session, user_email: str, result: dict) -
 
 
 def process_material(
-    df: pd.DataFrame, db: Session, user_email: str, result: dict
+    chunks: Iterable[pd.DataFrame], db: Session, user_email: str, result: dict
 ) -> dict:
     """Process material cost upload."""
-    # Try to map columns
-    column_mapping = {
-        "JobMtl_JobNum": "JobNum",
-        "JobMtl_IssueDate": "IssueDate",
-        "JobMtl_ExtCost": "ExtCost",
-    }
-    df = df.rename(columns=column_mapping)
+    from app.etl.transform import aggregate_material_by_week
 
     # Check for required columns
-    required = ["JobNum", "ExtCost"]
-    missing = [c for c in required if c not in df.columns]
-    if missing:
-        result["success"] = False
-        result["message"] = (
-            f"Missing required columns: {missing}. Found: {list(df.columns)}"
-        )
+    if missing_columns(result, MATERIAL_COLUMN_MAPPING, MATERIAL_REQUIRED_COLUMNS):
         return result
 
     # Aggregate by week
     try:
-        aggregated = aggregate_material_by_week(df)
+        aggregated = aggregate_material_by_week(map_columns(chunks, MATERIAL_COLUMN_MAPPING))
         result["rows_processed"] = len(aggregated)
         result["message"] = (
             f"Found {len(aggregated)} material cost records. Upload labor file to combine."
@@ -249,7 +294,7 @@ async def get_expected_columns():
     """Return expected column names for each file type."""
     return {
         "revenue": {
-            "required": ["DocExtPrice"],
+            "required": list(REVENUE_REQUIRED_COLUMNS),
             "recommended": [
                 "OrderNum",
                 "OrderDate",
@@ -261,7 +306,7 @@ async def get_expected_columns():
             "notes": "Revenue value should be in DocExtPrice column",
         },
         "labor": {
-            "required": ["JobNum", "LaborHrs"],
+            "required": list(LABOR_REQUIRED_COLUMNS),
             "recommended": [
                 "LaborDate",
                 "ResourceGrp",
@@ -272,12 +317,12 @@ async def get_expected_columns():
             "notes": "Labor hours per job",
         },
         "jobs": {
-            "required": ["JobNum"],
+            "required": list(JOB_REQUIRED_COLUMNS),
             "recommended": ["OrderNum", "PartNum", "ProdCode"],
             "notes": "Links jobs to sales orders and product codes",
         },
         "material": {
-            "required": ["JobNum", "ExtCost"],
+            "required": list(MATERIAL_REQUIRED_COLUMNS),
             "recommended": ["IssueDate"],
             "notes": "Material costs per job",
         },
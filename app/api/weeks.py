@@ -2,11 +2,13 @@
 from typing import List
 from collections import defaultdict
 from calendar import month_abbr
+from datetime import date
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy import desc, extract
 
 from app.database import get_db
+from app.cache import get_latest_week
 from app.models import DimWeek
 from app.schemas import WeekRead, WeekSummary, MonthSummary
 
@@ -38,10 +40,7 @@ def list_weeks(
 @router.get("/current", response_model=WeekSummary)
 def get_current_week(db: Session = Depends(get_db)):
     """Get the most recent week with data."""
-    week = db.query(DimWeek).order_by(
-        desc(DimWeek.iso_year),
-        desc(DimWeek.iso_week)
-    ).first()
+    week = get_latest_week(db)
 
     if not week:
         return WeekSummary(week_id=0, iso_year=2025, iso_week=1, label="No data")
@@ -60,30 +59,37 @@ def list_months(
     db: Session = Depends(get_db)
 ):
     """List available months with their week IDs, most recent first."""
-    weeks = db.query(DimWeek).order_by(
+    # Pick the most recent months in SQL (calendar month of week_start)
+    year = extract("year", DimWeek.week_start)
+    month = extract("month", DimWeek.week_start)
+    months = db.query(
+        year.label("year"), month.label("month")
+    ).group_by(year, month).order_by(desc(year), desc(month)).limit(limit).all()
+
+    if not months:
+        return []
+
+    # Fetch only the weeks falling in those months
+    oldest = months[-1]
+    weeks = db.query(DimWeek.week_id, DimWeek.week_start).filter(
+        DimWeek.week_start >= date(int(oldest.year), int(oldest.month), 1)
+    ).order_by(
         desc(DimWeek.iso_year),
         desc(DimWeek.iso_week)
     ).all()
 
-    # Group weeks by calendar month (based on week_start date)
-    months_dict = defaultdict(list)
+    week_ids_by_month = defaultdict(list)
     for w in weeks:
-        year = w.week_start.year
-        month = w.week_start.month
-        key = (year, month)
-        months_dict[key].append(w.week_id)
-
-    # Sort by year-month descending and convert to list
-    sorted_months = sorted(months_dict.keys(), reverse=True)[:limit]
+        week_ids_by_month[(w.week_start.year, w.week_start.month)].append(w.week_id)
 
     return [
         MonthSummary(
-            year=year,
-            month=month,
-            label=f"{month_abbr[month]} {year}",
-            week_ids=months_dict[(year, month)]
+            year=int(m.year),
+            month=int(m.month),
+            label=f"{month_abbr[int(m.month)]} {int(m.year)}",
+            week_ids=week_ids_by_month[(int(m.year), int(m.month))]
         )
-        for year, month in sorted_months
+        for m in months
     ]
 
 
@@ -0,0 +1,102 @@
+"""Background audit-log writer.
+
+Audit entries from hot request paths (e.g. login) are queued and written
+in batches by a daemon thread, so the request doesn't wait on a commit.
+"""
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import insert
+
+from app.database import SessionLocal
+from app.models import AuditLog
+
+logger = logging.getLogger(__name__)
+
+# A batch is written once it is this old or this large, whichever is first
+FLUSH_INTERVAL_SECONDS = 0.1
+MAX_BATCH_SIZE = 500
+
+_STOP = object()
+
+_queue: queue.SimpleQueue = queue.SimpleQueue()
+_worker: Optional[threading.Thread] = None
+_worker_lock = threading.Lock()
+
+
+def enqueue_audit(
+    user_email: str,
+    action: str,
+    entity: Optional[str] = None,
+    details: Optional[str] = None
+) -> None:
+    """Queue an audit entry for the background writer."""
+    _queue.put({
+        "timestamp": datetime.utcnow(),
+        "user_email": user_email,
+        "action": action,
+        "entity": entity,
+        "details": details,
+    })
+    _ensure_worker()
+
+
+def stop_audit_writer(timeout: float = 5.0) -> None:
+    """Flush queued entries and stop the writer (call on shutdown)."""
+    global _worker
+    with _worker_lock:
+        worker, _worker = _worker, None
+    if worker is not None and worker.is_alive():
+        _queue.put(_STOP)
+        worker.join(timeout)
+
+
+def write_batch(rows: List[dict]) -> None:
+    """Insert a batch of audit rows in one multi-row INSERT."""
+    db = SessionLocal()
+    try:
+        db.execute(insert(AuditLog), rows)
+        db.commit()
+    except Exception:
+        logger.exception(f"Failed to write {len(rows)} audit entries")
+    finally:
+        db.close()
+
+
+def _ensure_worker() -> None:
+    """Start the writer thread on first use."""
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run, name="audit-writer", daemon=True)
+            _worker.start()
+
+
+def _run() -> None:
+    """Collect queued entries into batches and write them until stopped."""
+    stopping = False
+    while not stopping:
+        item = _queue.get()
+        if item is _STOP:
+            return
+
+        batch = [item]
+        deadline = time.monotonic() + FLUSH_INTERVAL_SECONDS
+        while len(batch) < MAX_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = _queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                stopping = True
+                break
+            batch.append(item)
+
+        write_batch(batch)
@@ -4,9 +4,12 @@ NOTE: This is a demo/prototype implementation.
 For production, use a proper user database with hashed passwords.
 """
 from datetime import datetime, timedelta
-from typing import Optional
-from hashlib import sha256
-from jose import JWTError, jwt
+from typing import Dict, Optional, Tuple
+import hmac
+import threading
+import time
+from hashlib import blake2b, sha256
+from jose import JWTError, jwk, jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
@@ -16,17 +19,21 @@ from app.schemas import UserInfo
 # Bearer token security
 security = HTTPBearer(auto_error=False)
 
+# Key object built once; passing the raw secret makes jose re-parse it
+# (including a failed JSON decode) and rebuild the key on every call
+SIGNING_KEY = jwk.construct(settings.secret_key, settings.algorithm)
+
 
 def hash_password(password: str) -> str:
     """Simple password hashing for demo. Use bcrypt in production."""
     return sha256(password.encode()).hexdigest()
 
 
-# Demo password hash (sha256 of "demo123")
-DEMO_HASH = hash_password("demo123")
+# Demo password hash (sha256 of "demo123"), precomputed so import does no hashing
+DEMO_HASH = "d3ad9315b7be5dd53b31a273b3b3aba5defe700808305aa16a3062b76658a791"
 
 # Simple user store (in production, use database)
-# Format: email -> {password_hash, name, role}
+# Format: casefolded email -> {password_hash, name, role}
 USERS = {
     "jschroeder@jtecindustries.com": {"password": DEMO_HASH, "name": "Jesse Schroeder", "role": "cfo"},
     "bmyers@jtecindustries.com": {"password": DEMO_HASH, "name": "Bryan Myers", "role": "controller"},
@@ -44,17 +51,18 @@ USERS = {
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash."""
-    return hash_password(plain_password) == hashed_password
+    return hmac.compare_digest(hash_password(plain_password), hashed_password)
 
 
 def authenticate_user(email: str, password: str) -> Optional[dict]:
     """Authenticate user by email and password."""
-    user = USERS.get(email.lower())
+    email = email.casefold()
+    user = USERS.get(email)
     if not user:
         return None
     if not verify_password(password, user["password"]):
         return None
-    return {"email": email.lower(), "name": user["name"], "role": user["role"]}
+    return {"email": email, "name": user["name"], "role": user["role"]}
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -65,18 +73,47 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     else:
         expire = datetime.utcnow() + timedelta(minutes=settings.access_token_expire_minutes)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
+    encoded_jwt = jwt.encode(to_encode, SIGNING_KEY, algorithm=settings.algorithm)
     return encoded_jwt
 
 
+# Decoded tokens are cached briefly so a session's repeated requests skip
+# signature verification; entries never outlive the token's own expiry
+TOKEN_CACHE_TTL_SECONDS = 60
+TOKEN_CACHE_MAX_ENTRIES = 4096
+
+_token_cache: Dict[bytes, Tuple[float, dict]] = {}
+_token_cache_lock = threading.Lock()
+
+
+def _token_key(token: str) -> bytes:
+    """Cache key for a token (a digest, so raw JWTs aren't held in memory)."""
+    return blake2b(token.encode(), digest_size=16).digest()
+
+
 def decode_token(token: str) -> Optional[dict]:
     """Decode and validate a JWT token."""
+    key = _token_key(token)
+    now = time.time()
+    with _token_cache_lock:
+        hit = _token_cache.get(key)
+    if hit and now < hit[0]:
+        return hit[1]
+
     try:
-        payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
-        return payload
+        payload = jwt.decode(token, SIGNING_KEY, algorithms=[settings.algorithm])
     except JWTError:
         return None
 
+    expires_at = now + TOKEN_CACHE_TTL_SECONDS
+    if "exp" in payload:
+        expires_at = min(expires_at, float(payload["exp"]))
+    with _token_cache_lock:
+        if key not in _token_cache and len(_token_cache) >= TOKEN_CACHE_MAX_ENTRIES:
+            _token_cache.pop(next(iter(_token_cache)))
+        _token_cache[key] = (expires_at, payload)
+    return payload
+
 
 async def get_current_user(
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)
@@ -104,6 +141,7 @@ async def get_current_user(
             detail="Invalid token payload",
         )
 
+    email = email.casefold()
     user_data = USERS.get(email)
     if user_data is None:
         raise HTTPException(
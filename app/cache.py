@@ -0,0 +1,221 @@
+"""In-process caches for hot, rarely-changing lookups."""
+import functools
+import hashlib
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, NamedTuple, Optional, Tuple
+
+from sqlalchemy import desc
+from sqlalchemy.orm import Session
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import Response
+
+from app.models import DimWeek
+
+# The latest week only changes when the ETL loads a new week of data
+LATEST_WEEK_TTL_SECONDS = 30
+
+
+class CachedWeek(NamedTuple):
+    """Session-independent snapshot of a DimWeek row."""
+    week_id: int
+    iso_year: int
+    iso_week: int
+
+
+_lock = threading.Lock()
+_latest_week: Optional[CachedWeek] = None
+_latest_week_expires_at = 0.0
+
+
+def get_latest_week(db: Session) -> Optional[CachedWeek]:
+    """Get the most recent week with data, cached for a short TTL."""
+    global _latest_week, _latest_week_expires_at
+
+    with _lock:
+        if time.monotonic() < _latest_week_expires_at:
+            return _latest_week
+
+    week = db.query(DimWeek).order_by(
+        desc(DimWeek.iso_year), desc(DimWeek.iso_week)
+    ).first()
+    cached = CachedWeek(week.week_id, week.iso_year, week.iso_week) if week else None
+
+    with _lock:
+        _latest_week = cached
+        _latest_week_expires_at = time.monotonic() + LATEST_WEEK_TTL_SECONDS
+    return cached
+
+
+def invalidate_latest_week() -> None:
+    """Drop the cached latest week (call after loading new data)."""
+    global _latest_week, _latest_week_expires_at
+
+    with _lock:
+        _latest_week = None
+        _latest_week_expires_at = 0.0
+
+
+# ============ RESULT CACHE ============
+
+# Caches endpoint return values for the drill-down endpoints, whose
+# per-product/category/job paths the response cache doesn't cover; the
+# polled endpoints in RESPONSE_CACHE_POLICIES rely on that cache alone.
+# Results are only invalidated by the ETL, so the TTL just bounds
+# staleness if data is written by something that doesn't clear the cache
+RESULT_TTL_SECONDS = 60
+RESULT_CACHE_MAX_ENTRIES = 512
+# Single-flight locks are striped by key hash, so their number stays fixed
+# however many keys pass through the cache
+RESULT_LOCK_STRIPES = 32
+
+_results: Dict[Hashable, Tuple[float, Any]] = {}
+_result_locks = tuple(threading.Lock() for _ in range(RESULT_LOCK_STRIPES))
+
+
+def get_or_compute(key: Hashable, compute: Callable[[], Any], ttl: int = RESULT_TTL_SECONDS) -> Any:
+    """Return the cached value for key, computing it at most once per TTL.
+
+    Concurrent misses on the same key wait for the first caller to finish
+    (single-flight) rather than all querying the database.
+    """
+    with _lock:
+        hit = _results.get(key)
+        if hit and time.monotonic() < hit[0]:
+            return hit[1]
+
+    with _result_locks[hash(key) % RESULT_LOCK_STRIPES]:
+        with _lock:
+            hit = _results.get(key)
+            if hit and time.monotonic() < hit[0]:
+                return hit[1]
+
+        value = compute()
+
+        with _lock:
+            if key not in _results and len(_results) >= RESULT_CACHE_MAX_ENTRIES:
+                _results.pop(next(iter(_results)))
+            _results[key] = (time.monotonic() + ttl, value)
+        return value
+
+
+def cached_result(namespace: str, ttl: int = RESULT_TTL_SECONDS):
+    """Cache a sync endpoint's return value keyed on its arguments.
+
+    The `db` session argument is left out of the key. Exceptions (e.g.
+    404s) are not cached.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            params = tuple(sorted((k, v) for k, v in kwargs.items() if k != "db"))
+            return get_or_compute(
+                (namespace, args, params), lambda: func(*args, **kwargs), ttl
+            )
+        return wrapper
+    return decorator
+
+
+def clear_result_cache() -> None:
+    """Drop all cached endpoint results."""
+    with _lock:
+        _results.clear()
+
+
+# ============ RESPONSE CACHE ============
+
+# Freshness windows (seconds) for polled dashboard endpoints; data only
+# changes when the ETL runs, which clears the cache.
+SHORT_TTL_SECONDS = 5
+NORMAL_TTL_SECONDS = 20
+
+RESPONSE_CACHE_POLICIES = {
+    "/api/revenue": SHORT_TTL_SECONDS,
+    "/api/labor": SHORT_TTL_SECONDS,
+    "/api/margin": SHORT_TTL_SECONDS,
+    "/api/revenue/trend": NORMAL_TTL_SECONDS,
+    "/api/margin/trend": NORMAL_TTL_SECONDS,
+}
+
+# How long an expired entry may still be served if the handler fails
+STALE_FALLBACK_SECONDS = 300
+RESPONSE_CACHE_MAX_ENTRIES = 256
+
+
+class CachedResponse(NamedTuple):
+    """Serialized response body with its ETag and storage time."""
+    body: bytes
+    media_type: Optional[str]
+    etag: str
+    stored_at: float
+
+
+_responses: Dict[str, CachedResponse] = {}
+
+
+def clear_response_cache() -> None:
+    """Drop all cached responses."""
+    with _lock:
+        _responses.clear()
+
+
+def invalidate_data_caches() -> None:
+    """Clear every cache derived from fact/dimension data (call after ETL loads)."""
+    invalidate_latest_week()
+    clear_response_cache()
+    clear_result_cache()
+
+
+def _cached_response(entry: CachedResponse, ttl: int, request: Request) -> Response:
+    """Build a response (or 304) from a cache entry."""
+    headers = {"ETag": entry.etag, "Cache-Control": f"private, max-age={ttl}"}
+    if request.headers.get("if-none-match") == entry.etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type=entry.media_type, headers=headers)
+
+
+class ResponseCacheMiddleware(BaseHTTPMiddleware):
+    """Serve GET responses for polled endpoints from an in-process TTL cache.
+
+    Entries are keyed by path and query string. Hits skip the handler,
+    ORM and JSON serialization; expired entries are kept briefly as a
+    fallback when the handler returns a server error.
+    """
+
+    def __init__(self, app, policies: Dict[str, int] = RESPONSE_CACHE_POLICIES):
+        super().__init__(app)
+        self.policies = policies
+
+    async def dispatch(self, request: Request, call_next):
+        ttl = self.policies.get(request.url.path)
+        if request.method != "GET" or ttl is None:
+            return await call_next(request)
+
+        key = f"{request.url.path}?{request.url.query}"
+        now = time.monotonic()
+        with _lock:
+            entry = _responses.get(key)
+        if entry and now - entry.stored_at < ttl:
+            return _cached_response(entry, ttl, request)
+
+        response = await call_next(request)
+        if response.status_code >= 500:
+            if entry and now - entry.stored_at < STALE_FALLBACK_SECONDS:
+                return _cached_response(entry, ttl, request)
+            return response
+        if response.status_code != 200:
+            return response
+
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        entry = CachedResponse(
+            body=body,
+            media_type=response.media_type or response.headers.get("content-type"),
+            etag=f'"{hashlib.md5(body).hexdigest()}"',
+            stored_at=time.monotonic(),
+        )
+        with _lock:
+            if key not in _responses and len(_responses) >= RESPONSE_CACHE_MAX_ENTRIES:
+                _responses.pop(next(iter(_responses)))
+            _responses[key] = entry
+        return _cached_response(entry, ttl, request)
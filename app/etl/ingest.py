@@ -1,47 +1,87 @@
 """ETL Ingest - Load CSV/Excel files into staging dataframes."""
-import pandas as pd
+from __future__ import annotations
+
 from pathlib import Path
-from typing import Optional
+from typing import TYPE_CHECKING, Callable, Iterable, Optional
 from datetime import datetime
 import logging
 
+if TYPE_CHECKING:
+    import pandas as pd
+
 logger = logging.getLogger(__name__)
 
 
-def load_csv(file_path: Path, encoding: str = "utf-8") -> pd.DataFrame:
+def load_csv(
+    file_path: Path, encoding: str = "utf-8", usecols: Optional[Callable[[str], bool]] = None
+) -> pd.DataFrame:
     """Load a CSV file into a DataFrame."""
+    import pandas as pd
+
     logger.info(f"Loading CSV: {file_path}")
-    df = pd.read_csv(file_path, encoding=encoding)
+    df = pd.read_csv(file_path, encoding=encoding, usecols=usecols)
     logger.info(f"Loaded {len(df)} rows from {file_path.name}")
     return df
 
 
-def load_excel(file_path: Path, sheet_name: Optional[str] = None) -> pd.DataFrame:
+# Rows per chunk when streaming CSV uploads (app.api.upload.read_upload)
+CSV_CHUNK_ROWS = 100_000
+
+
+def load_excel(
+    file_path: Path, sheet_name: Optional[str] = None, usecols: Optional[Callable[[str], bool]] = None
+) -> pd.DataFrame:
     """Load an Excel file into a DataFrame."""
+    import pandas as pd
+
     logger.info(f"Loading Excel: {file_path}")
-    df = pd.read_excel(file_path, sheet_name=sheet_name or 0)
+    df = pd.read_excel(file_path, sheet_name=sheet_name or 0, usecols=usecols)
     logger.info(f"Loaded {len(df)} rows from {file_path.name}")
     return df
 
 
-def detect_file_type(file_path: Path) -> str:
-    """Detect file type from extension."""
-    suffix = file_path.suffix.lower()
-    if suffix == ".csv":
-        return "csv"
-    elif suffix in [".xlsx", ".xls"]:
+# Leading bytes of Excel workbooks: .xlsx is a zip archive, .xls an OLE2 file
+XLSX_MAGIC = b"PK\x03\x04"
+XLS_MAGIC = b"\xd0\xcf\x11\xe0"
+
+
+def detect_format(header: bytes, suffix: str) -> str:
+    """Detect file type from its leading bytes, falling back to the extension.
+
+    BAQ exports are sometimes mislabeled (e.g. CSV text saved as .xls), so
+    an Excel extension without workbook magic bytes is read as CSV.
+    """
+    if header.startswith(XLSX_MAGIC) or header.startswith(XLS_MAGIC):
         return "excel"
-    else:
-        raise ValueError(f"Unsupported file type: {suffix}")
+    if suffix.lower() in [".csv", ".xlsx", ".xls"]:
+        return "csv"
+    raise ValueError(f"Unsupported file type: {suffix}")
+
+
+def detect_file_type(file_path: Path) -> str:
+    """Detect file type from the file's magic bytes and extension."""
+    with open(file_path, "rb") as f:
+        header = f.read(len(XLS_MAGIC))
+    return detect_format(header, file_path.suffix)
 
 
-def load_file(file_path: Path) -> pd.DataFrame:
+def load_file(file_path: Path, usecols: Optional[Callable[[str], bool]] = None) -> pd.DataFrame:
     """Load a file (CSV or Excel) into a DataFrame."""
     file_type = detect_file_type(file_path)
     if file_type == "csv":
-        return load_csv(file_path)
+        return load_csv(file_path, usecols=usecols)
     else:
-        return load_excel(file_path)
+        return load_excel(file_path, usecols=usecols)
+
+
+def column_filter(*names: Iterable[str]) -> Callable[[str], bool]:
+    """Build a `usecols` predicate keeping only the given column names.
+
+    Columns the transforms never read are skipped by the parser instead of
+    being type-inferred and materialized.
+    """
+    wanted = set().union(*names)
+    return lambda column: column in wanted
 
 
 def validate_columns(df: pd.DataFrame, required_columns: list, file_name: str) -> bool:
@@ -75,8 +115,6 @@ MATERIAL_COLUMNS = [
 
 def load_revenue_export(file_path: Path) -> pd.DataFrame:
     """Load and validate a revenue BAQ export."""
-    df = load_file(file_path)
-
     # Try to map common column variations
     column_mapping = {
         "Order_OrderNum": "OrderNum",
@@ -87,6 +125,7 @@ def load_revenue_export(file_path: Path) -> pd.DataFrame:
         "OrderDtl_DocExtPriceDtl": "DocExtPrice",
         "OrderHed_OpenOrder": "OpenOrder",
     }
+    df = load_file(file_path, usecols=column_filter(column_mapping, REVENUE_COLUMNS, {"ShipDate"}))
     df = df.rename(columns=column_mapping)
 
     # Check for required columns (be flexible)
@@ -99,8 +138,6 @@ def load_revenue_export(file_path: Path) -> pd.DataFrame:
 
 def load_labor_export(file_path: Path) -> pd.DataFrame:
     """Load and validate a labor BAQ export."""
-    df = load_file(file_path)
-
     column_mapping = {
         "LaborDtl_JobNum": "JobNum",
         "LaborDtl_ClockInDate": "LaborDate",
@@ -108,6 +145,7 @@ def load_labor_export(file_path: Path) -> pd.DataFrame:
         "LaborDtl_LaborHrs": "LaborHrs",
         "LaborDtl_BurdenHrs": "BurdenHrs",
     }
+    df = load_file(file_path, usecols=column_filter(column_mapping, LABOR_COLUMNS, {"ClockInDate"}))
     df = df.rename(columns=column_mapping)
 
     core_columns = ["JobNum", "LaborHrs"]
@@ -119,14 +157,13 @@ def load_labor_export(file_path: Path) -> pd.DataFrame:
 
 def load_job_export(file_path: Path) -> pd.DataFrame:
     """Load and validate a job BAQ export."""
-    df = load_file(file_path)
-
     column_mapping = {
         "JobHead_JobNum": "JobNum",
         "JobHead_OrderNum": "OrderNum",
         "JobHead_PartNum": "PartNum",
         "Part_ProdCode": "ProdCode",
     }
+    df = load_file(file_path, usecols=column_filter(column_mapping, JOB_COLUMNS))
     df = df.rename(columns=column_mapping)
 
     core_columns = ["JobNum"]
@@ -138,13 +175,12 @@ def load_job_export(file_path: Path) -> pd.DataFrame:
 
 def load_material_export(file_path: Path) -> pd.DataFrame:
     """Load and validate a material cost BAQ export."""
-    df = load_file(file_path)
-
     column_mapping = {
         "JobMtl_JobNum": "JobNum",
         "JobMtl_IssueDate": "IssueDate",
         "JobMtl_ExtCost": "ExtCost",
     }
+    df = load_file(file_path, usecols=column_filter(column_mapping, MATERIAL_COLUMNS, {"TranDate"}))
     df = df.rename(columns=column_mapping)
 
     core_columns = ["JobNum", "ExtCost"]
@@ -1,92 +1,225 @@
 """ETL Loader - Upsert transformed data into database."""
 import pandas as pd
 from decimal import Decimal
-from datetime import date
-from typing import Dict, Tuple, Optional
+from datetime import date, datetime
+from itertools import islice
+from typing import Dict, Iterable, Iterator, Tuple, Optional
+from sqlalchemy import insert, select, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import Session
 import logging
 
+from app.database import UNENFORCED_UNIQUE_TABLES
 from app.models import DimWeek, DimProduct, DimJob, FactRevenue, FactCosts, Direction, AuditLog
+from app.cache import invalidate_data_caches
 
 logger = logging.getLogger(__name__)
 
-
-def get_or_create_week(db: Session, week_start: date, iso_year: int, iso_week: int) -> DimWeek:
-    """Get existing week or create new one."""
-    week = db.query(DimWeek).filter(DimWeek.week_start == week_start).first()
-    if not week:
-        week_end = week_start + pd.Timedelta(days=6)
-        week = DimWeek(
-            week_start=week_start,
-            week_end=week_end,
-            iso_year=iso_year,
-            iso_week=iso_week
-        )
-        db.add(week)
-        db.flush()
-        logger.info(f"Created week: {iso_year}-W{iso_week:02d}")
-    return week
-
-
-def get_or_create_product(
+# Bulk writes are sent as one executemany per batch, and key lookups as one
+# IN (...) query per batch so large uploads stay under bind-parameter limits
+BULK_BATCH_SIZE = 5000
+
+
+def batched(values: Iterable) -> Iterator[list]:
+    """Split values into lists of at most BULK_BATCH_SIZE.
+
+    Values are consumed lazily, so a generator of rows is never held in
+    memory more than one batch at a time.
+    """
+    values = iter(values)
+    while batch := list(islice(values, BULK_BATCH_SIZE)):
+        yield batch
+
+
+def bulk_insert(db: Session, model, rows: Iterable[dict]) -> None:
+    """Insert plain-dict rows for a model in batched executemany calls.
+
+    Rows go straight to a Core insert on the model's table (keys are column
+    names), skipping the ORM bulk-insert layer's per-row attribute handling.
+    """
+    # Core execution doesn't autoflush, so push pending ORM changes first
+    db.flush()
+    connection = db.connection()
+    statement = insert(model.__table__)
+    for batch in batched(rows):
+        connection.execute(statement, batch)
+
+
+def bulk_update(db: Session, model, rows: list) -> None:
+    """Update rows by primary key (each dict includes it) in batched executemany calls."""
+    for start in range(0, len(rows), BULK_BATCH_SIZE):
+        db.execute(update(model), rows[start:start + BULK_BATCH_SIZE])
+
+
+# Dialects whose INSERT supports ON CONFLICT DO NOTHING
+CONFLICT_INSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+
+def skip_existing(db: Session, model, rows: Iterable[dict], key_columns: list) -> Iterator[dict]:
+    """Yield the rows whose key_columns values aren't already in the model's table."""
+    columns = [getattr(model, column) for column in key_columns]
+    for batch in batched(rows):
+        keys = [tuple(row[column] for column in key_columns) for row in batch]
+        existing = set(map(tuple, db.execute(select(*columns).where(tuple_(*columns).in_(keys)))))
+        yield from (row for row, row_key in zip(batch, keys) if row_key not in existing)
+
+
+def insert_missing(db: Session, model, rows: Iterable[dict], key_columns: list) -> None:
+    """Bulk-insert dimension rows, skipping any whose natural key already exists.
+
+    Uses INSERT ... ON CONFLICT DO NOTHING where supported, so a concurrent
+    load creating the same week/product/job doesn't fail the whole batch.
+    Otherwise (or when init_db couldn't create the table's unique index)
+    existing keys are looked up per batch and skipped.
+    """
+    conflict_insert = CONFLICT_INSERTS.get(db.get_bind().dialect.name)
+    if conflict_insert is None or model.__tablename__ in UNENFORCED_UNIQUE_TABLES:
+        bulk_insert(db, model, skip_existing(db, model, rows, key_columns))
+        return
+    stmt = conflict_insert(model).on_conflict_do_nothing(index_elements=key_columns)
+    for batch in batched(rows):
+        db.execute(stmt, batch)
+
+
+def to_decimal(values: pd.Series) -> pd.Series:
+    """Convert a numeric column to Decimal in one pass (via its string form)."""
+    return values.astype(str).map(Decimal)
+
+
+def as_date(value) -> date:
+    """Normalize a week_start value (date, datetime or Timestamp) to a date."""
+    return value.date() if isinstance(value, datetime) else value
+
+
+def resolve_weeks(db: Session, weeks: Iterable[Tuple[date, int, int]]) -> Dict[date, int]:
+    """Map week_start -> week_id for (week_start, iso_year, iso_week) tuples.
+
+    Existing weeks are fetched in one query and missing ones bulk-inserted.
+    """
+    wanted = {as_date(start): (iso_year, iso_week) for start, iso_year, iso_week in weeks}
+    if not wanted:
+        return {}
+
+    def fetch():
+        week_ids = {}
+        for batch in batched(wanted):
+            week_ids.update(db.query(DimWeek.week_start, DimWeek.week_id).filter(
+                DimWeek.week_start.in_(batch)
+            ))
+        return week_ids
+
+    week_ids = fetch()
+    missing = [
+        {
+            "week_start": start,
+            "week_end": start + pd.Timedelta(days=6),
+            "iso_year": int(iso_year),
+            "iso_week": int(iso_week),
+        }
+        for start, (iso_year, iso_week) in wanted.items()
+        if start not in week_ids
+    ]
+    if missing:
+        insert_missing(db, DimWeek, missing, ["week_start"])
+        week_ids = fetch()
+        logger.info(f"Created {len(missing)} weeks")
+    return week_ids
+
+
+def resolve_products(
     db: Session,
-    product_group: str,
-    category: str,
+    keys: Iterable[Tuple[str, str]],
     product_line: str = "IPS",
     target_margins: Optional[Dict[Tuple[str, str], Decimal]] = None
-) -> DimProduct:
-    """Get existing product or create new one."""
-    product = db.query(DimProduct).filter(
-        DimProduct.product_group == product_group,
-        DimProduct.category == category
-    ).first()
-
-    if not product:
-        target_margin = None
-        if target_margins:
-            target_margin = target_margins.get((product_group, category))
-
-        product = DimProduct(
-            product_line=product_line,
-            product_group=product_group,
-            category=category,
-            target_margin=target_margin
-        )
-        db.add(product)
-        db.flush()
-        logger.info(f"Created product: {product_group} / {category}")
-    return product
-
-
-def get_or_create_job(
-    db: Session,
-    job_num: str,
-    sales_order_num: Optional[str] = None,
-    part_num: Optional[str] = None,
-    product_id: Optional[int] = None
-) -> DimJob:
-    """Get existing job or create new one."""
-    job = db.query(DimJob).filter(DimJob.job_num == job_num).first()
-
-    if not job:
-        job = DimJob(
-            job_num=job_num,
-            sales_order_num=sales_order_num,
-            part_num=part_num,
-            product_id=product_id
-        )
-        db.add(job)
-        db.flush()
-        logger.info(f"Created job: {job_num}")
-    elif sales_order_num and not job.sales_order_num:
-        # Update missing fields
-        job.sales_order_num = sales_order_num
-        if part_num:
-            job.part_num = part_num
-        if product_id:
-            job.product_id = product_id
-        db.flush()
-    return job
+) -> Dict[Tuple[str, str], int]:
+    """Map (product_group, category) -> product_id, bulk-inserting missing products."""
+    wanted = set(keys)
+    if not wanted:
+        return {}
+
+    def fetch():
+        product_ids = {}
+        for batch in batched(wanted):
+            rows = db.query(
+                DimProduct.product_group, DimProduct.category, DimProduct.product_id
+            ).filter(
+                tuple_(DimProduct.product_group, DimProduct.category).in_(batch)
+            ).order_by(DimProduct.product_id)
+            for group, category, product_id in rows:
+                # If duplicates exist, the lowest product_id wins
+                product_ids.setdefault((group, category), product_id)
+        return product_ids
+
+    product_ids = fetch()
+    missing = [
+        {
+            "product_line": product_line,
+            "product_group": group,
+            "category": category,
+            "target_margin": target_margins.get((group, category)) if target_margins else None,
+        }
+        for group, category in sorted(wanted)
+        if (group, category) not in product_ids
+    ]
+    if missing:
+        insert_missing(db, DimProduct, missing, ["product_group", "category"])
+        product_ids = fetch()
+        logger.info(f"Created {len(missing)} products")
+    return product_ids
+
+
+def resolve_jobs(
+    db: Session, jobs: Dict[str, Tuple[Optional[str], Optional[str], Optional[int]]]
+) -> Dict[str, int]:
+    """Map job_num -> job_id for {job_num: (sales_order_num, part_num, product_id)}.
+
+    Missing jobs are bulk-inserted; existing jobs without a sales order get
+    this load's sales order (and part/product, when given) in one bulk update.
+    """
+    if not jobs:
+        return {}
+
+    def fetch():
+        rows = []
+        for batch in batched(jobs):
+            rows.extend(db.query(DimJob.job_num, DimJob.job_id, DimJob.sales_order_num).filter(
+                DimJob.job_num.in_(batch)
+            ))
+        return rows
+
+    job_ids = {}
+    updates = []
+    for job_num, job_id, current_order in fetch():
+        job_ids[job_num] = job_id
+        sales_order_num, part_num, product_id = jobs[job_num]
+        if sales_order_num and not current_order:
+            # Update missing fields
+            values = {"job_id": job_id, "sales_order_num": sales_order_num}
+            if part_num:
+                values["part_num"] = part_num
+            if product_id:
+                values["product_id"] = product_id
+            updates.append(values)
+
+    missing = [
+        {
+            "job_num": job_num,
+            "sales_order_num": sales_order_num,
+            "part_num": part_num,
+            "product_id": product_id,
+        }
+        for job_num, (sales_order_num, part_num, product_id) in sorted(jobs.items())
+        if job_num not in job_ids
+    ]
+    bulk_update(db, DimJob, updates)
+    if missing:
+        insert_missing(db, DimJob, missing, ["job_num"])
+        job_ids = {job_num: job_id for job_num, job_id, _ in fetch()}
+        logger.info(f"Created {len(missing)} jobs")
+    return job_ids
 
 
 def load_revenue(
@@ -95,64 +228,74 @@ def load_revenue(
     target_margins: Optional[Dict[Tuple[str, str], Decimal]] = None,
     user_email: str = "system@etl"
 ) -> int:
-    """Load aggregated revenue data into fact table."""
-    rows_loaded = 0
-
-    for _, row in revenue_df.iterrows():
-        # Get or create dimension records
-        week = get_or_create_week(
-            db,
-            week_start=row["week_start"],
-            iso_year=int(row["iso_year"]),
-            iso_week=int(row["iso_week"])
-        )
-
-        product = get_or_create_product(
-            db,
-            product_group=str(row["product_group"]),
-            category=str(row["category"]),
-            target_margins=target_margins
-        )
-
-        # Determine direction
-        direction = Direction.INBOUND if row["direction"] == "inbound" else Direction.OUTBOUND
+    """Load aggregated revenue data into fact table.
+
+    Dimensions and existing facts are resolved with a few set-based queries
+    up front; facts are then bulk-inserted or bulk-updated by primary key.
+    """
+    revenue_df = revenue_df.assign(
+        revenue=to_decimal(revenue_df["revenue"]),
+        order_count=revenue_df["order_count"].astype(int)
+    )
+    rows = list(revenue_df.itertuples(index=False))
+    rows_loaded = len(rows)
 
-        # Check for existing fact record
-        existing = db.query(FactRevenue).filter(
-            FactRevenue.week_id == week.week_id,
-            FactRevenue.product_id == product.product_id,
-            FactRevenue.direction == direction
-        ).first()
+    week_ids = resolve_weeks(
+        db, ((row.week_start, row.iso_year, row.iso_week) for row in rows)
+    )
+    product_ids = resolve_products(
+        db,
+        ((str(row.product_group), str(row.category)) for row in rows),
+        target_margins=target_margins
+    )
 
-        if existing:
-            # Update existing
-            existing.revenue = Decimal(str(row["revenue"]))
-            existing.order_count = int(row["order_count"])
+    # Existing facts for the touched weeks/products, keyed like the upload
+    existing = {}
+    if rows:
+        existing_rows = db.query(
+            FactRevenue.week_id, FactRevenue.product_id, FactRevenue.direction, FactRevenue.fact_id
+        ).filter(
+            FactRevenue.week_id.in_(set(week_ids.values())),
+            FactRevenue.product_id.in_(set(product_ids.values()))
+        )
+        for week_id, product_id, direction, fact_id in existing_rows:
+            existing.setdefault((week_id, product_id, direction), fact_id)
+
+    new_facts = []
+    updated_facts = []
+    for row in rows:
+        week_id = week_ids[as_date(row.week_start)]
+        product_id = product_ids[(str(row.product_group), str(row.category))]
+        direction = Direction.INBOUND if row.direction == "inbound" else Direction.OUTBOUND
+        values = {
+            "revenue": row.revenue,
+            "order_count": row.order_count
+        }
+
+        fact_id = existing.get((week_id, product_id, direction))
+        if fact_id is not None:
+            updated_facts.append({"fact_id": fact_id, **values})
         else:
-            # Create new
-            fact = FactRevenue(
-                week_id=week.week_id,
-                product_id=product.product_id,
-                direction=direction,
-                revenue=Decimal(str(row["revenue"])),
-                order_count=int(row["order_count"])
-            )
-            db.add(fact)
-
-        rows_loaded += 1
-
-    db.commit()
-
-    # Audit log
-    audit = AuditLog(
-        user_email=user_email,
-        action="UPLOAD",
-        entity="revenue",
-        details=f"Loaded {rows_loaded} revenue records"
-    )
-    db.add(audit)
+            new_facts.append({
+                "week_id": week_id,
+                "product_id": product_id,
+                "direction": direction,
+                **values
+            })
+
+    bulk_update(db, FactRevenue, updated_facts)
+    bulk_insert(db, FactRevenue, new_facts)
+
+    # Audit log, committed in the same transaction as the facts
+    bulk_insert(db, AuditLog, [{
+        "user_email": user_email,
+        "action": "UPLOAD",
+        "entity": "revenue",
+        "details": f"Loaded {rows_loaded} revenue records"
+    }])
     db.commit()
 
+    invalidate_data_caches()
     logger.info(f"Loaded {rows_loaded} revenue records")
     return rows_loaded
 
@@ -165,102 +308,108 @@ def load_costs(
     target_margins: Optional[Dict[Tuple[str, str], Decimal]] = None,
     user_email: str = "system@etl"
 ) -> int:
-    """Load aggregated cost data into fact table."""
-    rows_loaded = 0
+    """Load aggregated cost data into fact table.
 
+    Dimensions and existing facts are resolved with a few set-based queries
+    up front; facts are then bulk-inserted or bulk-updated by primary key.
+    """
     # Build job info lookup from job_df if provided
     job_info = {}
     if job_df is not None:
-        for _, row in job_df.iterrows():
-            job_num = str(row.get("JobNum", ""))
+        for row in job_df.itertuples(index=False):
+            job_num = str(getattr(row, "JobNum", ""))
             if job_num:
                 job_info[job_num] = {
-                    "sales_order_num": str(row.get("OrderNum", "")) if pd.notna(row.get("OrderNum")) else None,
-                    "part_num": str(row.get("PartNum", "")) if pd.notna(row.get("PartNum")) else None,
-                    "prod_code": str(row.get("ProdCode", "Unknown")) if pd.notna(row.get("ProdCode")) else "Unknown"
+                    "sales_order_num": str(getattr(row, "OrderNum", "")) if pd.notna(getattr(row, "OrderNum", None)) else None,
+                    "part_num": str(getattr(row, "PartNum", "")) if pd.notna(getattr(row, "PartNum", None)) else None,
+                    "prod_code": str(getattr(row, "ProdCode", "Unknown")) if pd.notna(getattr(row, "ProdCode", None)) else "Unknown"
                 }
 
     # Build material lookup
     material_lookup = {}
-    if material_df is not None:
-        for _, row in material_df.iterrows():
-            key = (int(row["iso_year"]), int(row["iso_week"]), str(row["JobNum"]))
-            material_lookup[key] = Decimal(str(row["material_cost"]))
-
-    # Load labor (and join material)
-    for _, row in labor_df.iterrows():
-        job_num = str(row["JobNum"])
-
-        # Get job info
-        info = job_info.get(job_num, {})
-        sales_order_num = info.get("sales_order_num")
-        part_num = info.get("part_num")
-        prod_code = info.get("prod_code", "Unknown")
-
-        # Get or create product (use prod_code as product_group)
-        product = get_or_create_product(
-            db,
-            product_group=prod_code,
-            category="Unknown",  # Will be updated when more info available
-            target_margins=target_margins
+    if material_df is not None and not material_df.empty:
+        material_keys = material_df.assign(
+            iso_year=material_df["iso_year"].astype(int),
+            iso_week=material_df["iso_week"].astype(int),
+            JobNum=material_df["JobNum"].astype(str)
         )
-
-        # Get or create week
-        week = get_or_create_week(
-            db,
-            week_start=row["week_start"],
-            iso_year=int(row["iso_year"]),
-            iso_week=int(row["iso_week"])
+        material_costs = material_keys.groupby(
+            ["iso_year", "iso_week", "JobNum"], sort=False
+        )["material_cost"].sum()
+        material_lookup = to_decimal(material_costs).to_dict()
+
+    labor_df = labor_df.assign(
+        direct_labor=to_decimal(labor_df["direct_labor"]),
+        burden=to_decimal(labor_df["burden"])
+    )
+    rows = list(labor_df.itertuples(index=False))
+    rows_loaded = len(rows)
+    job_nums = {str(row.JobNum) for row in rows}
+
+    # Products (prod_code as product_group), weeks and jobs for the whole upload
+    prod_codes = {job_num: job_info.get(job_num, {}).get("prod_code", "Unknown") for job_num in job_nums}
+    product_ids = resolve_products(
+        db,
+        ((prod_code, "Unknown") for prod_code in prod_codes.values()),  # Category updated when more info available
+        target_margins=target_margins
+    )
+    week_ids = resolve_weeks(
+        db, ((row.week_start, row.iso_year, row.iso_week) for row in rows)
+    )
+    job_ids = resolve_jobs(db, {
+        job_num: (
+            job_info.get(job_num, {}).get("sales_order_num"),
+            job_info.get(job_num, {}).get("part_num"),
+            product_ids[(prod_codes[job_num], "Unknown")]
         )
+        for job_num in job_nums
+    })
+
+    # Existing facts for the touched weeks/jobs
+    existing = {}
+    if rows:
+        for batch in batched(set(job_ids.values())):
+            existing_rows = db.query(FactCosts.week_id, FactCosts.job_id, FactCosts.fact_id).filter(
+                FactCosts.week_id.in_(set(week_ids.values())),
+                FactCosts.job_id.in_(batch)
+            )
+            for week_id, job_id, fact_id in existing_rows:
+                existing.setdefault((week_id, job_id), fact_id)
 
-        # Get or create job
-        job = get_or_create_job(
-            db,
-            job_num=job_num,
-            sales_order_num=sales_order_num,
-            part_num=part_num,
-            product_id=product.product_id
-        )
+    # Load labor (and join material)
+    new_facts = []
+    updated_facts = []
+    for row in rows:
+        job_num = str(row.JobNum)
+        week_id = week_ids[as_date(row.week_start)]
+        job_id = job_ids[job_num]
 
         # Get material cost
-        material_key = (int(row["iso_year"]), int(row["iso_week"]), job_num)
-        material_cost = material_lookup.get(material_key, Decimal("0"))
-
-        # Check for existing fact record
-        existing = db.query(FactCosts).filter(
-            FactCosts.week_id == week.week_id,
-            FactCosts.job_id == job.job_id
-        ).first()
-
-        if existing:
-            # Update existing
-            existing.direct_labor = Decimal(str(row["direct_labor"]))
-            existing.burden = Decimal(str(row["burden"]))
-            existing.material_cost = material_cost
+        material_key = (int(row.iso_year), int(row.iso_week), job_num)
+        values = {
+            "direct_labor": row.direct_labor,
+            "burden": row.burden,
+            "material_cost": material_lookup.get(material_key, Decimal("0"))
+        }
+
+        fact_id = existing.get((week_id, job_id))
+        if fact_id is not None:
+            updated_facts.append({"fact_id": fact_id, **values})
         else:
-            # Create new
-            fact = FactCosts(
-                week_id=week.week_id,
-                job_id=job.job_id,
-                direct_labor=Decimal(str(row["direct_labor"])),
-                burden=Decimal(str(row["burden"])),
-                material_cost=material_cost
-            )
-            db.add(fact)
-
-        rows_loaded += 1
-
-    db.commit()
-
-    # Audit log
-    audit = AuditLog(
-        user_email=user_email,
-        action="UPLOAD",
-        entity="costs",
-        details=f"Loaded {rows_loaded} cost records"
-    )
-    db.add(audit)
+            new_facts.append({"week_id": week_id, "job_id": job_id, **values})
+
+    bulk_update(db, FactCosts, updated_facts)
+    bulk_insert(db, FactCosts, new_facts)
+
+    # Audit log, committed in the same transaction as the facts
+    bulk_insert(db, AuditLog, [{
+        "user_email": user_email,
+        "action": "UPLOAD",
+        "entity": "costs",
+        "details": f"Loaded {rows_loaded} cost records"
+    }])
     db.commit()
 
+    invalidate_data_caches()
     logger.info(f"Loaded {rows_loaded} cost records")
     return rows_loaded
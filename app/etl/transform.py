@@ -1,8 +1,9 @@
 """ETL Transform - Clean, aggregate, and calculate metrics."""
+import numpy as np
 import pandas as pd
 from decimal import Decimal
 from datetime import date, datetime, timedelta
-from typing import Dict, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple, Union
 import logging
 
 logger = logging.getLogger(__name__)
@@ -21,15 +22,46 @@ def get_week_bounds(d: date) -> Tuple[date, date]:
     return monday, sunday
 
 
+def iso_week_arrays(dates: Iterable[date]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Vectorized get_iso_week + get_week_bounds: ISO years, ISO weeks and week starts.
+
+    Mondays come from integer math on days since the epoch (1970-01-05 was
+    a Monday) and the ISO fields from pandas' isocalendar, instead of a
+    Python date method call per value.
+    """
+    days = np.array(list(dates), dtype="datetime64[D]").view("i8")
+    mondays = ((days - 4) // 7 * 7 + 4).astype("datetime64[D]")
+    # Second resolution covers every date (nanoseconds overflow outside 1677-2262)
+    mondays = pd.DatetimeIndex(mondays.astype("datetime64[s]"))
+    iso = mondays.isocalendar()
+    return iso["year"].to_numpy(np.int64), iso["week"].to_numpy(np.int64), mondays.date
+
+
+# Date string formats accepted by parse_date, grouped by shape so only the
+# formats that could match are tried (month-first wins over day-first)
+DASHED_DATE_FORMATS = ("%Y-%m-%d",)
+YEAR_FIRST_DATE_FORMATS = ("%Y/%m/%d",)
+SLASHED_DATE_FORMATS = ("%m/%d/%Y", "%d/%m/%Y")
+
+
 def parse_date(value) -> Optional[date]:
     """Parse various date formats to a date object."""
     if pd.isna(value):
         return None
-    if isinstance(value, (datetime, date)):
-        return value if isinstance(value, date) else value.date()
+    # datetime (and pandas Timestamp) subclass date, so check it first
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
     if isinstance(value, str):
         # Try common formats
-        for fmt in ["%Y-%m-%d", "%m/%d/%Y", "%d/%m/%Y", "%Y/%m/%d"]:
+        if "-" in value:
+            formats = DASHED_DATE_FORMATS
+        elif value.find("/") == 4:
+            formats = YEAR_FIRST_DATE_FORMATS
+        else:
+            formats = SLASHED_DATE_FORMATS
+        for fmt in formats:
             try:
                 return datetime.strptime(value, fmt).date()
             except ValueError:
@@ -37,17 +69,38 @@ def parse_date(value) -> Optional[date]:
     return None
 
 
-def aggregate_revenue_by_week(df: pd.DataFrame) -> pd.DataFrame:
-    """Aggregate revenue data by week and product group."""
-    # Parse dates
-    date_col = "OrderDate" if "OrderDate" in df.columns else "ShipDate"
-    df["parsed_date"] = df[date_col].apply(parse_date)
+def add_week_columns(df: pd.DataFrame, date_col: str) -> pd.DataFrame:
+    """Parse dates and add iso_year/iso_week/week_start columns.
+
+    Exports repeat the same few dates across many rows, so parsing and
+    week lookups run once per distinct value and are broadcast back by
+    factorized codes. Rows without a parseable date are dropped.
+    """
+    codes, uniques = pd.factorize(df[date_col])
+    # Index -1 (missing values) picks the trailing None
+    parsed = np.array([parse_date(v) for v in uniques] + [None], dtype=object)
+    df["parsed_date"] = parsed[codes]
     df = df.dropna(subset=["parsed_date"])
 
-    # Add week info
-    df["iso_year"] = df["parsed_date"].apply(lambda d: get_iso_week(d)[0])
-    df["iso_week"] = df["parsed_date"].apply(lambda d: get_iso_week(d)[1])
-    df["week_start"] = df["parsed_date"].apply(lambda d: get_week_bounds(d)[0])
+    codes, dates = pd.factorize(df["parsed_date"])
+    iso_years, iso_weeks, week_starts = iso_week_arrays(dates)
+    return df.assign(
+        iso_year=iso_years[codes],
+        iso_week=iso_weeks[codes],
+        week_start=week_starts[codes],
+    )
+
+
+# Group keys of the weekly aggregates
+REVENUE_KEYS = ["iso_year", "iso_week", "week_start", "product_group", "category", "direction"]
+WEEK_JOB_KEYS = ["iso_year", "iso_week", "week_start", "JobNum"]
+
+
+def prepare_revenue(df: pd.DataFrame) -> pd.DataFrame:
+    """Add week, direction and numeric revenue/product columns to revenue rows."""
+    # Parse dates and add week info
+    date_col = "OrderDate" if "OrderDate" in df.columns else "ShipDate"
+    df = add_week_columns(df, date_col)
 
     # Determine direction (inbound = open order, outbound = shipped/closed)
     if "OpenOrder" in df.columns:
@@ -61,11 +114,20 @@ def aggregate_revenue_by_week(df: pd.DataFrame) -> pd.DataFrame:
     # Get product mapping
     df["product_group"] = df.get("ProdCode", "Unknown")
     df["category"] = df.get("PartClass", "Unknown")
+    return df
+
+
+def aggregate_revenue_by_week(df: Union[pd.DataFrame, Iterable[pd.DataFrame]]) -> pd.DataFrame:
+    """Aggregate revenue data by week and product group.
+
+    Also accepts an iterable of chunks (e.g. a streamed CSV upload).
+    """
+    if not isinstance(df, pd.DataFrame):
+        return aggregate_revenue_in_chunks(df)
+    df = prepare_revenue(df)
 
     # Aggregate
-    agg = df.groupby(
-        ["iso_year", "iso_week", "week_start", "product_group", "category", "direction"]
-    ).agg(
+    agg = df.groupby(REVENUE_KEYS).agg(
         revenue=("revenue", "sum"),
         order_count=("OrderNum", "nunique")
     ).reset_index()
@@ -74,17 +136,41 @@ def aggregate_revenue_by_week(df: pd.DataFrame) -> pd.DataFrame:
     return agg
 
 
-def aggregate_labor_by_week(df: pd.DataFrame, rate_table: Optional[pd.DataFrame] = None) -> pd.DataFrame:
-    """Aggregate labor data by week and job."""
-    # Parse dates
-    date_col = "LaborDate" if "LaborDate" in df.columns else "ClockInDate"
-    df["parsed_date"] = df[date_col].apply(parse_date)
-    df = df.dropna(subset=["parsed_date"])
+def aggregate_revenue_in_chunks(chunks: Iterable[pd.DataFrame]) -> pd.DataFrame:
+    """Aggregate revenue from streamed chunks (e.g. a chunked CSV upload).
+
+    Each chunk is reduced to one row per group and order before the next is
+    read, so distinct order counts stay exact across chunk boundaries.
+    """
+    parts = [
+        prepare_revenue(chunk).groupby(REVENUE_KEYS + ["OrderNum"], dropna=False)["revenue"]
+        .sum().reset_index()
+        for chunk in chunks
+    ]
+    if not parts:
+        return pd.DataFrame()
+
+    agg = pd.concat(parts, ignore_index=True).groupby(REVENUE_KEYS).agg(
+        revenue=("revenue", "sum"),
+        order_count=("OrderNum", "nunique")
+    ).reset_index()
+
+    logger.info(f"Aggregated revenue: {len(agg)} rows")
+    return agg
+
 
-    # Add week info
-    df["iso_year"] = df["parsed_date"].apply(lambda d: get_iso_week(d)[0])
-    df["iso_week"] = df["parsed_date"].apply(lambda d: get_iso_week(d)[1])
-    df["week_start"] = df["parsed_date"].apply(lambda d: get_week_bounds(d)[0])
+def aggregate_labor_by_week(
+    df: Union[pd.DataFrame, Iterable[pd.DataFrame]], rate_table: Optional[pd.DataFrame] = None
+) -> pd.DataFrame:
+    """Aggregate labor data by week and job.
+
+    Also accepts an iterable of chunks (e.g. a streamed CSV upload).
+    """
+    if not isinstance(df, pd.DataFrame):
+        return aggregate_labor_in_chunks(df, rate_table)
+    # Parse dates and add week info
+    date_col = "LaborDate" if "LaborDate" in df.columns else "ClockInDate"
+    df = add_week_columns(df, date_col)
 
     # Ensure numeric hours
     df["labor_hrs"] = pd.to_numeric(df.get("LaborHrs", 0), errors="coerce").fillna(0)
@@ -95,14 +181,10 @@ def aggregate_labor_by_week(df: pd.DataFrame, rate_table: Optional[pd.DataFrame]
     default_burden_rate = Decimal("28.00")
 
     if rate_table is not None and "ResourceGrp" in df.columns:
-        # Join rate table by resource group
-        rate_dict = rate_table.set_index("ResourceGrp")[["LaborRate", "BurdenRate"]].to_dict("index")
-        df["labor_rate"] = df["ResourceGrp"].apply(
-            lambda x: rate_dict.get(x, {}).get("LaborRate", float(default_labor_rate))
-        )
-        df["burden_rate"] = df["ResourceGrp"].apply(
-            lambda x: rate_dict.get(x, {}).get("BurdenRate", float(default_burden_rate))
-        )
+        # Join rate table by resource group (vectorized hash lookup)
+        rates = rate_table.set_index("ResourceGrp")
+        df["labor_rate"] = df["ResourceGrp"].map(rates["LaborRate"]).fillna(float(default_labor_rate))
+        df["burden_rate"] = df["ResourceGrp"].map(rates["BurdenRate"]).fillna(float(default_burden_rate))
     else:
         df["labor_rate"] = float(default_labor_rate)
         df["burden_rate"] = float(default_burden_rate)
@@ -112,9 +194,7 @@ def aggregate_labor_by_week(df: pd.DataFrame, rate_table: Optional[pd.DataFrame]
     df["burden_cost"] = df["burden_hrs"] * df["burden_rate"]
 
     # Aggregate by week and job
-    agg = df.groupby(
-        ["iso_year", "iso_week", "week_start", "JobNum"]
-    ).agg(
+    agg = df.groupby(WEEK_JOB_KEYS).agg(
         direct_labor=("direct_labor_cost", "sum"),
         burden=("burden_cost", "sum"),
         labor_hours=("labor_hrs", "sum"),
@@ -125,25 +205,22 @@ def aggregate_labor_by_week(df: pd.DataFrame, rate_table: Optional[pd.DataFrame]
     return agg
 
 
-def aggregate_material_by_week(df: pd.DataFrame) -> pd.DataFrame:
-    """Aggregate material costs by week and job."""
-    # Parse dates
-    date_col = "IssueDate" if "IssueDate" in df.columns else "TranDate"
-    df["parsed_date"] = df[date_col].apply(parse_date)
-    df = df.dropna(subset=["parsed_date"])
+def aggregate_material_by_week(df: Union[pd.DataFrame, Iterable[pd.DataFrame]]) -> pd.DataFrame:
+    """Aggregate material costs by week and job.
 
-    # Add week info
-    df["iso_year"] = df["parsed_date"].apply(lambda d: get_iso_week(d)[0])
-    df["iso_week"] = df["parsed_date"].apply(lambda d: get_iso_week(d)[1])
-    df["week_start"] = df["parsed_date"].apply(lambda d: get_week_bounds(d)[0])
+    Also accepts an iterable of chunks (e.g. a streamed CSV upload).
+    """
+    if not isinstance(df, pd.DataFrame):
+        return aggregate_material_in_chunks(df)
+    # Parse dates and add week info
+    date_col = "IssueDate" if "IssueDate" in df.columns else "TranDate"
+    df = add_week_columns(df, date_col)
 
     # Ensure numeric cost
     df["material_cost"] = pd.to_numeric(df.get("ExtCost", 0), errors="coerce").fillna(0)
 
     # Aggregate by week and job
-    agg = df.groupby(
-        ["iso_year", "iso_week", "week_start", "JobNum"]
-    ).agg(
+    agg = df.groupby(WEEK_JOB_KEYS).agg(
         material_cost=("material_cost", "sum")
     ).reset_index()
 
@@ -151,30 +228,60 @@ def aggregate_material_by_week(df: pd.DataFrame) -> pd.DataFrame:
     return agg
 
 
+def combine_weekly_sums(parts: List[pd.DataFrame]) -> pd.DataFrame:
+    """Re-sum per-chunk (week, job) aggregates into a single result."""
+    if not parts:
+        return pd.DataFrame()
+    return pd.concat(parts, ignore_index=True).groupby(WEEK_JOB_KEYS).sum().reset_index()
+
+
+def aggregate_labor_in_chunks(
+    chunks: Iterable[pd.DataFrame], rate_table: Optional[pd.DataFrame] = None
+) -> pd.DataFrame:
+    """Aggregate labor from streamed chunks (e.g. a chunked CSV upload)."""
+    agg = combine_weekly_sums([aggregate_labor_by_week(chunk, rate_table) for chunk in chunks])
+    logger.info(f"Aggregated labor: {len(agg)} rows")
+    return agg
+
+
+def aggregate_material_in_chunks(chunks: Iterable[pd.DataFrame]) -> pd.DataFrame:
+    """Aggregate material costs from streamed chunks (e.g. a chunked CSV upload)."""
+    agg = combine_weekly_sums([aggregate_material_by_week(chunk) for chunk in chunks])
+    logger.info(f"Aggregated material: {len(agg)} rows")
+    return agg
+
+
 def load_target_margins(file_path: str) -> Dict[Tuple[str, str], Decimal]:
     """Load target gross margins from Corp. Mapping file."""
-    df = pd.read_csv(file_path) if file_path.endswith(".csv") else pd.read_excel(file_path)
-
     # Handle the structure of Corp. Mapping file
     # Expected columns: Product Line, Product Group (Unnamed:2), Category, Jtec US Margin
+    # Only the last three are parsed; reindex fills any that are absent with NaN
+    wanted = ["Unnamed: 2", "Category", "Jtec US Margin"]
+    usecols = lambda column: column in wanted
+    if file_path.endswith(".csv"):
+        df = pd.read_csv(file_path, usecols=usecols)
+    else:
+        df = pd.read_excel(file_path, usecols=usecols)
     margins = {}
 
-    current_group = None
-    for _, row in df.iterrows():
-        # Check if this row has a product group
-        if pd.notna(row.get("Unnamed: 2")) and str(row.get("Unnamed: 2")).strip() not in ["x", "X", ""]:
-            current_group = str(row.get("Unnamed: 2")).strip()
-
-        # Check if this row has a category and margin
-        category = row.get("Category")
-        margin = row.get("Jtec US Margin")
-
-        if pd.notna(category) and pd.notna(margin) and current_group:
-            try:
-                margin_val = Decimal(str(margin))
-                margins[(current_group, str(category))] = margin_val
-            except:
-                pass
+    columns = df.reindex(columns=wanted)
+
+    # A product group applies to every following row until the next one
+    # ("x" and blank cells are placeholders, not groups)
+    groups = columns["Unnamed: 2"]
+    stripped = groups.astype(str).str.strip()
+    is_group = groups.notna() & ~stripped.isin(["x", "X", ""])
+    product_group = stripped.where(is_group).ffill()
+
+    # Rows with a category, a margin and a group seen above them
+    valid = columns["Category"].notna() & columns["Jtec US Margin"].notna() & product_group.notna()
+    for group, category, margin in zip(
+        product_group[valid], columns["Category"][valid], columns["Jtec US Margin"][valid]
+    ):
+        try:
+            margins[(group, str(category))] = Decimal(str(margin))
+        except:
+            pass
 
     logger.info(f"Loaded {len(margins)} target margins")
     return margins
@@ -7,11 +7,13 @@ from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import RedirectResponse
+from fastapi.responses import ORJSONResponse, RedirectResponse
 from contextlib import asynccontextmanager
 
 from app.config import settings
 from app.database import init_db
+from app.cache import ResponseCacheMiddleware
+from app.audit_writer import stop_audit_writer
 from app.api import auth, revenue, margin, labor, drill, audit, weeks, upload
 
 # Template and static file paths
@@ -25,7 +27,8 @@ async def lifespan(app: FastAPI):
     # Startup: Initialize database
     init_db()
     yield
-    # Shutdown: cleanup if needed
+    # Shutdown: flush queued audit entries
+    stop_audit_writer()
 
 
 app = FastAPI(
@@ -33,6 +36,8 @@ app = FastAPI(
     version=settings.app_version,
     description="Weekly Manufacturing KPI Dashboard - Track revenue, margin, and labor metrics",
     lifespan=lifespan,
+    # orjson encodes the Decimal-heavy KPI payloads in C
+    default_response_class=ORJSONResponse,
 )
 
 # CORS middleware for frontend access
@@ -44,6 +49,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Short-TTL response cache for polled dashboard endpoints
+app.add_middleware(ResponseCacheMiddleware)
+
 # Include routers
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(weeks.router, prefix="/api/weeks", tags=["Weeks"])
@@ -3,7 +3,7 @@ from datetime import date, datetime
 from decimal import Decimal
 from sqlalchemy import (
     Column, Integer, String, Date, DateTime, Numeric, Boolean,
-    ForeignKey, Text, Enum as SQLEnum
+    ForeignKey, Text, Index, Enum as SQLEnum, text
 )
 from sqlalchemy.orm import relationship
 import enum
@@ -22,6 +22,10 @@ class Direction(enum.Enum):
 class DimWeek(Base):
     """Week dimension table for time-series analysis."""
     __tablename__ = "dim_week"
+    __table_args__ = (
+        # Week lists and the latest-week lookup sort by (iso_year, iso_week) desc
+        Index("ix_dim_week_year_week", "iso_year", "iso_week"),
+    )
 
     week_id = Column(Integer, primary_key=True, autoincrement=True)
     week_start = Column(Date, nullable=False, unique=True)
@@ -29,14 +33,20 @@ class DimWeek(Base):
     iso_year = Column(Integer, nullable=False)
     iso_week = Column(Integer, nullable=False)
 
-    # Relationships
-    revenues = relationship("FactRevenue", back_populates="week")
-    costs = relationship("FactCosts", back_populates="week")
+    # Relationships (lazy="raise_on_sql" throughout: queries select the
+    # columns they need, so an implicit lazy load would be an N+1 bug;
+    # use selectinload/joinedload where a relationship is really needed)
+    revenues = relationship("FactRevenue", back_populates="week", lazy="raise_on_sql")
+    costs = relationship("FactCosts", back_populates="week", lazy="raise_on_sql")
 
 
 class DimProduct(Base):
     """Product dimension with hierarchy: Line > Group > Category."""
     __tablename__ = "dim_product"
+    __table_args__ = (
+        # Loaders resolve products by (product_group, category)
+        Index("ix_dim_product_group_category", "product_group", "category", unique=True),
+    )
 
     product_id = Column(Integer, primary_key=True, autoincrement=True)
     product_line = Column(String(50), nullable=False)  # IPS, APS, WPS
@@ -45,13 +55,26 @@ class DimProduct(Base):
     target_margin = Column(Numeric(5, 4), nullable=True)  # e.g., 0.3000 for 30%
 
     # Relationships
-    revenues = relationship("FactRevenue", back_populates="product")
-    jobs = relationship("DimJob", back_populates="product")
+    revenues = relationship("FactRevenue", back_populates="product", lazy="raise_on_sql")
+    jobs = relationship("DimJob", back_populates="product", lazy="raise_on_sql")
 
 
 class DimJob(Base):
     """Job dimension linking jobs to sales orders and products."""
     __tablename__ = "dim_job"
+    __table_args__ = (
+        # Partial indexes so WIP/completed labor filters only touch matching jobs
+        Index(
+            "ix_dim_job_wip", "job_id",
+            postgresql_where=text("job_closed = false"),
+            sqlite_where=text("job_closed = 0"),
+        ),
+        Index(
+            "ix_dim_job_completed", "job_id",
+            postgresql_where=text("job_closed = true"),
+            sqlite_where=text("job_closed = 1"),
+        ),
+    )
 
     job_id = Column(Integer, primary_key=True, autoincrement=True)
     job_num = Column(String(50), nullable=False, unique=True)
@@ -61,8 +84,8 @@ class DimJob(Base):
     job_closed = Column(Boolean, default=False)  # False=WIP, True=Completed
 
     # Relationships
-    product = relationship("DimProduct", back_populates="jobs")
-    costs = relationship("FactCosts", back_populates="job")
+    product = relationship("DimProduct", back_populates="jobs", lazy="raise_on_sql")
+    costs = relationship("FactCosts", back_populates="job", lazy="raise_on_sql")
 
 
 # ============ FACT TABLES ============
@@ -70,6 +93,11 @@ class DimJob(Base):
 class FactRevenue(Base):
     """Revenue fact table - weekly revenue by product and direction."""
     __tablename__ = "fact_revenue"
+    __table_args__ = (
+        # Endpoints filter on week first, then join/group by product and direction;
+        # unique because loaders upsert one row per (week, product, direction)
+        Index("ix_fact_revenue_week_product_direction", "week_id", "product_id", "direction", unique=True),
+    )
 
     fact_id = Column(Integer, primary_key=True, autoincrement=True)
     week_id = Column(Integer, ForeignKey("dim_week.week_id"), nullable=False)
@@ -79,16 +107,23 @@ class FactRevenue(Base):
     order_count = Column(Integer, nullable=False, default=0)
 
     # Relationships
-    week = relationship("DimWeek", back_populates="revenues")
-    product = relationship("DimProduct", back_populates="revenues")
+    week = relationship("DimWeek", back_populates="revenues", lazy="raise_on_sql")
+    product = relationship("DimProduct", back_populates="revenues", lazy="raise_on_sql")
 
 
 class FactCosts(Base):
     """Costs fact table - weekly costs by job.
 
     Maps to jt_zLaborDtl01 and jt_zJobMaterial BAQs.
+    Grain is one row per (week, job): every loader upserts on that key,
+    so this table already is the per-job weekly rollup.
     """
     __tablename__ = "fact_costs"
+    __table_args__ = (
+        # Endpoints filter on week first, then join/group by job; unique
+        # because loaders upsert one row per (week, job)
+        Index("ix_fact_costs_week_job", "week_id", "job_id", unique=True),
+    )
 
     fact_id = Column(Integer, primary_key=True, autoincrement=True)
     week_id = Column(Integer, ForeignKey("dim_week.week_id"), nullable=False)
@@ -106,8 +141,8 @@ class FactCosts(Base):
     material_cost = Column(Numeric(18, 2), nullable=False, default=0)
 
     # Relationships
-    week = relationship("DimWeek", back_populates="costs")
-    job = relationship("DimJob", back_populates="costs")
+    week = relationship("DimWeek", back_populates="costs", lazy="raise_on_sql")
+    job = relationship("DimJob", back_populates="costs", lazy="raise_on_sql")
 
     @property
     def total_cost(self) -> Decimal:
@@ -120,6 +155,10 @@ class FactCosts(Base):
 class AuditLog(Base):
     """Audit log for tracking all data changes and user actions."""
     __tablename__ = "audit_log"
+    __table_args__ = (
+        # Newest-first keyset pagination
+        Index("ix_audit_log_timestamp_id", "timestamp", "log_id"),
+    )
 
     log_id = Column(Integer, primary_key=True, autoincrement=True)
     timestamp = Column(DateTime, nullable=False, default=datetime.utcnow)
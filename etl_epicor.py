@@ -2,13 +2,23 @@
 
 Pulls data from Epicor Connector at 192.168.50.10:8080 and loads into FOS.
 """
+import os
+import numpy as np
+import orjson
+import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
 from decimal import Decimal
-from datetime import datetime, date, timedelta
-from collections import defaultdict
+from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from hashlib import sha256
+from pathlib import Path
 from sqlalchemy.orm import Session
 
 from app.database import SessionLocal, init_db
+from app.etl.loader import bulk_insert, resolve_weeks
+from app.etl.transform import iso_week_arrays
 from app.models import DimWeek, DimProduct, DimJob, FactRevenue, FactCosts, Direction
 
 EPICOR_CONNECTOR = "http://192.168.50.10:8080"
@@ -17,6 +27,34 @@ EPICOR_CONNECTOR = "http://192.168.50.10:8080"
 DEFAULT_LABOR_RATE = Decimal("45.00")
 DEFAULT_BURDEN_RATE = Decimal("28.00")
 
+# Per-record sums are accumulated as floats and rounded to cents once per
+# fact row (Decimal arithmetic dominated the aggregation loops)
+DEFAULT_LABOR_RATE_F = float(DEFAULT_LABOR_RATE)
+DEFAULT_BURDEN_RATE_F = float(DEFAULT_BURDEN_RATE)
+
+
+def to_money(value: float) -> Decimal:
+    """Round an accumulated float to a 2-place Decimal."""
+    return Decimal(f"{value:.2f}")
+
+
+# One session for all BAQ queries so connections to the connector are kept
+# alive and reused; the pool fits the concurrent fetches in run_etl
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=4))
+SESSION.headers["Connection"] = "keep-alive"
+
+# Set ETL_CACHE=1 to keep raw BAQ responses under .etl_cache/ and reuse them
+# on later runs (for development: cached responses are never refreshed)
+ETL_CACHE = os.environ.get("ETL_CACHE") == "1"
+ETL_CACHE_DIR = Path(__file__).resolve().parent / ".etl_cache"
+
+
+def baq_cache_path(payload: dict) -> Path:
+    """Cache file for a BAQ request, keyed by a hash of the full payload."""
+    key = sha256(orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)).hexdigest()[:32]
+    return ETL_CACHE_DIR / f"{payload['baq_name']}-{key}.json"
+
 
 def query_baq(baq_name: str, odata_filter: str = None, top: int = 10000) -> list:
     """Query a BAQ from the Epicor Connector."""
@@ -30,12 +68,21 @@ def query_baq(baq_name: str, odata_filter: str = None, top: int = 10000) -> list
     if odata_filter:
         payload["parameters"]["$filter"] = odata_filter
 
+    cache_path = baq_cache_path(payload) if ETL_CACHE else None
     try:
-        resp = requests.post(f"{EPICOR_CONNECTOR}/query", json=payload, timeout=120)
-        data = resp.json()
+        if cache_path and cache_path.exists():
+            content = cache_path.read_bytes()
+        else:
+            resp = SESSION.post(f"{EPICOR_CONNECTOR}/query", json=payload, timeout=120)
+            content = resp.content
+        data = orjson.loads(content)
         if data.get("error"):
             print(f"  Error querying {baq_name}: {data.get('message')}")
             return []
+        # Raw bytes are cached (only for successful queries), not parsed records
+        if cache_path and not cache_path.exists():
+            ETL_CACHE_DIR.mkdir(exist_ok=True)
+            cache_path.write_bytes(content)
         return data.get("records", [])
     except Exception as e:
         print(f"  Exception querying {baq_name}: {e}")
@@ -54,59 +101,110 @@ def get_week_start(dt: date) -> date:
 
 
 def create_weeks_from_data(db: Session, dates: list) -> dict:
-    """Create week dimension from actual dates in data."""
-    weeks = {}
-    for dt in dates:
-        if not dt:
-            continue
-        week_start = get_week_start(dt)
-        if week_start in weeks:
-            continue
-
-        iso_year, iso_week = get_iso_week(week_start)
-        week_end = week_start + timedelta(days=6)
-
-        existing = db.query(DimWeek).filter(DimWeek.week_start == week_start).first()
-        if existing:
-            weeks[week_start] = existing
-        else:
-            week = DimWeek(
-                week_start=week_start,
-                week_end=week_end,
-                iso_year=iso_year,
-                iso_week=iso_week
-            )
-            db.add(week)
-            db.flush()
-            weeks[week_start] = week
-
+    """Create week dimension from actual dates in data (week_start -> week_id)."""
+    # Distinct weeks in first-seen order, resolved with one lookup and one insert
+    week_starts = dict.fromkeys(get_week_start(dt) for dt in dates if dt)
+    weeks = resolve_weeks(db, ((start, *get_iso_week(start)) for start in week_starts))
     db.commit()
     return weeks
 
 
+@lru_cache(maxsize=8192)
+def parse_iso_day(day: str) -> date:
+    """Parse a YYYY-MM-DD string (cached: records share a few thousand days)."""
+    return date.fromisoformat(day)
+
+
 def parse_date(date_str: str) -> date:
     """Parse ISO date string to date object."""
     if not date_str:
         return None
     try:
-        # Handle ISO format: "2025-12-17T00:00:00-06:00"
-        return datetime.fromisoformat(date_str.replace('Z', '+00:00')).date()
+        # Handle ISO format: "2025-12-17T00:00:00-06:00". Only the local
+        # date is kept, so the time and offset needn't be parsed.
+        return parse_iso_day(date_str[:10])
     except:
         return None
 
 
-def load_jobs(db: Session) -> dict:
-    """Load jobs from jt_zjobhead01 BAQ."""
-    print("Loading jobs from jt_zjobhead01 (2024+)...")
+def product_ids_by_line(db: Session) -> dict:
+    """Map product_line -> product_id (the first product per line wins)."""
+    product_ids = {}
+    rows = db.query(DimProduct.product_line, DimProduct.product_id).order_by(DimProduct.product_id)
+    for product_line, product_id in rows:
+        product_ids.setdefault(product_line, product_id)
+    return product_ids
+
+
+def is_set(values: pd.Series) -> pd.Series:
+    """Mask of values that are present and non-empty (truthy record fields)."""
+    return values.notna() & values.ne("")
+
+
+def numeric_or_zero(values: pd.Series) -> pd.Series:
+    """Column version of float(value or 0): missing and empty values are 0."""
+    return pd.to_numeric(values.where(is_set(values), 0)).astype(float)
+
+
+def week_starts(values: pd.Series) -> np.ndarray:
+    """Parse a column of ISO dates to each row's week start (None if unparseable).
+
+    Records share a few thousand distinct dates, so each is parsed once,
+    week starts are computed array-wise, and both are broadcast back by
+    factorized codes.
+    """
+    codes, uniques = pd.factorize(values)
+    dates = [parse_date(v) for v in uniques]
+    parsed = [i for i, d in enumerate(dates) if d]
+    # Index -1 (missing values) picks the trailing None
+    starts = np.full(len(dates) + 1, None, dtype=object)
+    starts[parsed] = iso_week_arrays(dates[i] for i in parsed)[2]
+    return starts[codes]
+
+
+def fetch_jobs() -> list:
+    """Query jt_zjobhead01 BAQ records."""
     # Filter to 2024+ jobs and get more records
-    records = query_baq(
+    return query_baq(
         "jt_zjobhead01",
         odata_filter="JobHead_StartDate ge 2024-01-01T00:00:00Z",
         top=50000
     )
+
+
+def fetch_labor() -> list:
+    """Query jt_zLaborDtl01 BAQ records."""
+    # Filter to 2024+ data for relevance
+    return query_baq(
+        "jt_zLaborDtl01",
+        odata_filter="LaborDtl_PayrollDate ge 2024-01-01T00:00:00Z",
+        top=50000
+    )
+
+
+def fetch_revenue() -> list:
+    """Query JtecGrossMargin BAQ records."""
+    return query_baq(
+        "JtecGrossMargin",
+        odata_filter="ShipHead_ShipDate ge 2024-01-01T00:00:00Z",
+        top=50000
+    )
+
+
+def load_jobs(db: Session, records: list = None) -> dict:
+    """Load jobs from jt_zjobhead01 BAQ (fetched here unless records are given)."""
+    print("Loading jobs from jt_zjobhead01 (2024+)...")
+    if records is None:
+        records = fetch_jobs()
     print(f"  Retrieved {len(records)} job records")
 
+    # Existing jobs and products are fetched once; new ones are collected
+    # and bulk-inserted after the loop
+    existing_jobs = dict(db.query(DimJob.job_num, DimJob.job_id))
+    product_ids = product_ids_by_line(db)
     jobs = {}
+    new_jobs = {}
+    new_products = {}
     prod_codes = set()
     skipped_uf = 0
 
@@ -124,35 +222,34 @@ def load_jobs(db: Session) -> dict:
         prod_codes.add(prod_code)
 
         # Find or create product (simplified - group by ProdCode)
-        product = db.query(DimProduct).filter(
-            DimProduct.product_line == prod_code
-        ).first()
-
-        if not product:
-            product = DimProduct(
-                product_line=prod_code,
-                product_group=prod_code,
-                category="General",
-                target_margin=Decimal("0.25")
-            )
-            db.add(product)
-            db.flush()
-
-        existing = db.query(DimJob).filter(DimJob.job_num == job_num).first()
-        if existing:
-            jobs[job_num] = existing
-        else:
-            job = DimJob(
-                job_num=job_num,
-                sales_order_num=None,  # Would need JobProd join
-                part_num=rec.get("JobHead_PartNum"),
-                product_id=product.product_id,
-                job_closed=rec.get("JobHead_JobClosed", False)
-            )
-            db.add(job)
-            db.flush()
-            jobs[job_num] = job
-
+        if prod_code not in product_ids and prod_code not in new_products:
+            new_products[prod_code] = {
+                "product_line": prod_code,
+                "product_group": prod_code,
+                "category": "General",
+                "target_margin": Decimal("0.25")
+            }
+
+        if job_num in existing_jobs:
+            jobs[job_num] = existing_jobs[job_num]
+        elif job_num not in new_jobs:
+            new_jobs[job_num] = (prod_code, {
+                "job_num": job_num,
+                "sales_order_num": None,  # Would need JobProd join
+                "part_num": rec.get("JobHead_PartNum"),
+                "job_closed": rec.get("JobHead_JobClosed", False)
+            })
+
+    if new_products:
+        bulk_insert(db, DimProduct, list(new_products.values()))
+        product_ids = product_ids_by_line(db)
+
+    if new_jobs:
+        bulk_insert(db, DimJob, [
+            {**job, "product_id": product_ids[prod_code]} for prod_code, job in new_jobs.values()
+        ])
+        created_ids = dict(db.query(DimJob.job_num, DimJob.job_id))
+        jobs.update((job_num, created_ids[job_num]) for job_num in new_jobs)
     db.commit()
     print(f"  Created/updated {len(jobs)} jobs")
     print(f"  Skipped {skipped_uf} UF (unfirm) jobs")
@@ -160,125 +257,110 @@ def load_jobs(db: Session) -> dict:
     return jobs
 
 
-def load_labor(db: Session, jobs: dict, weeks: dict):
-    """Load labor data from jt_zLaborDtl01 BAQ."""
+def load_labor(db: Session, jobs: dict, weeks: dict, records: list = None):
+    """Load labor data from jt_zLaborDtl01 BAQ (fetched here unless records are given)."""
     print("Loading labor from jt_zLaborDtl01 (2024+)...")
-    # Filter to 2024+ data for relevance
-    records = query_baq(
-        "jt_zLaborDtl01",
-        odata_filter="LaborDtl_PayrollDate ge 2024-01-01T00:00:00Z",
-        top=50000
-    )
+    if records is None:
+        records = fetch_labor()
     print(f"  Retrieved {len(records)} labor records")
 
-    # Aggregate by job + week
-    labor_data = defaultdict(lambda: {
-        "labor_hours": Decimal("0"),
-        "burden_hours": Decimal("0"),
-        "direct_labor": Decimal("0"),
-        "burden": Decimal("0")
-    })
-
-    dates_found = []
-    for rec in records:
-        job_num = rec.get("LaborDtl_JobNum", "")
-        labor_date = parse_date(rec.get("LaborDtl_PayrollDate") or rec.get("LaborDtl_ClockInDate"))
-
-        if not job_num or not labor_date:
-            continue
-
-        dates_found.append(labor_date)
-        week_start = get_week_start(labor_date)
-
-        labor_hrs = Decimal(str(rec.get("LaborDtl_LaborHrs", 0) or 0))
-        burden_hrs = Decimal(str(rec.get("LaborDtl_BurdenHrs", 0) or 0))
-
-        key = (job_num, week_start)
-        labor_data[key]["labor_hours"] += labor_hrs
-        labor_data[key]["burden_hours"] += burden_hrs
-        labor_data[key]["direct_labor"] += labor_hrs * DEFAULT_LABOR_RATE
-        labor_data[key]["burden"] += burden_hrs * DEFAULT_BURDEN_RATE
+    # Aggregate hours by job + week (costs are hours x the flat default
+    # rates, so they are computed once per key at insert)
+    labor = pd.DataFrame(records, columns=[
+        "LaborDtl_JobNum", "LaborDtl_PayrollDate", "LaborDtl_ClockInDate",
+        "LaborDtl_LaborHrs", "LaborDtl_BurdenHrs"
+    ])
+    payroll_dates = labor["LaborDtl_PayrollDate"]
+    labor_dates = payroll_dates.where(is_set(payroll_dates), labor["LaborDtl_ClockInDate"])
+    labor = labor.assign(week_start=week_starts(labor_dates))
+    labor = labor[is_set(labor["LaborDtl_JobNum"]) & labor["week_start"].notna()]
+    labor = labor.assign(
+        labor_hours=numeric_or_zero(labor["LaborDtl_LaborHrs"]),
+        burden_hours=numeric_or_zero(labor["LaborDtl_BurdenHrs"])
+    )
+    labor_data = labor.groupby(["LaborDtl_JobNum", "week_start"], sort=False)[
+        ["labor_hours", "burden_hours"]
+    ].sum()
 
     # Create weeks from labor dates
-    if dates_found:
-        weeks.update(create_weeks_from_data(db, dates_found))
-
-    # Create cost records
-    created = 0
-    for (job_num, week_start), data in labor_data.items():
-        job = jobs.get(job_num)
-        week = weeks.get(week_start)
-
-        if not job or not week:
+    if not labor.empty:
+        weeks.update(create_weeks_from_data(db, labor["week_start"].unique()))
+
+    # Create cost records, skipping (job, week) pairs that already have one
+    existing_costs = set(db.query(FactCosts.job_id, FactCosts.week_id).filter(
+        FactCosts.week_id.in_(set(weeks.values()))
+    ).all())
+    new_costs = []
+    for (job_num, week_start), labor_hours, burden_hours in zip(
+        labor_data.index, labor_data["labor_hours"], labor_data["burden_hours"]
+    ):
+        job_id = jobs.get(job_num)
+        week_id = weeks.get(week_start)
+
+        if not job_id or not week_id:
             continue
 
-        existing = db.query(FactCosts).filter(
-            FactCosts.job_id == job.job_id,
-            FactCosts.week_id == week.week_id
-        ).first()
-
-        if not existing:
-            cost = FactCosts(
-                week_id=week.week_id,
-                job_id=job.job_id,
-                labor_hours=data["labor_hours"],
-                burden_hours=data["burden_hours"],
-                direct_labor=data["direct_labor"],
-                burden=data["burden"],
-                material_cost=Decimal("0")  # From jt_zJobMaterial
-            )
-            db.add(cost)
-            created += 1
-
+        if (job_id, week_id) not in existing_costs:
+            new_costs.append({
+                "week_id": week_id,
+                "job_id": job_id,
+                "labor_hours": to_money(labor_hours),
+                "burden_hours": to_money(burden_hours),
+                "direct_labor": to_money(labor_hours * DEFAULT_LABOR_RATE_F),
+                "burden": to_money(burden_hours * DEFAULT_BURDEN_RATE_F),
+                "material_cost": Decimal("0")  # From jt_zJobMaterial
+            })
+
+    bulk_insert(db, FactCosts, new_costs)
     db.commit()
-    print(f"  Created {created} cost records")
+    print(f"  Created {len(new_costs)} cost records")
+
 
+def load_revenue(db: Session, weeks: dict, margin_records: list = None):
+    """Load revenue from JtecGrossMargin (outbound) and JtecSalesOrderBacklog (inbound).
 
-def load_revenue(db: Session, weeks: dict):
-    """Load revenue from JtecGrossMargin (outbound) and JtecSalesOrderBacklog (inbound)."""
+    Records are fetched here unless given.
+    """
     print("Loading revenue from JtecGrossMargin (2024+)...")
-    margin_records = query_baq(
-        "JtecGrossMargin",
-        odata_filter="ShipHead_ShipDate ge 2024-01-01T00:00:00Z",
-        top=50000
-    )
+    if margin_records is None:
+        margin_records = fetch_revenue()
     print(f"  Retrieved {len(margin_records)} margin records")
 
     # Get products for grouping
     products = {p.product_group: p for p in db.query(DimProduct).all()}
 
     # Aggregate outbound revenue by product group + week
-    revenue_data = defaultdict(lambda: {
-        "inbound": Decimal("0"),
-        "outbound": Decimal("0"),
-        "order_count": 0
-    })
-
-    dates_found = []
-    for rec in margin_records:
-        ship_date = parse_date(rec.get("ShipHead_ShipDate"))
-        if not ship_date:
-            continue
-
-        dates_found.append(ship_date)
-        week_start = get_week_start(ship_date)
-        prod_group = rec.get("ProdGrup_Description") or "Other"
-
-        amount = Decimal(str(rec.get("Calculated_Amount", 0) or 0))
-
-        key = (prod_group, week_start)
-        revenue_data[key]["outbound"] += amount
-        revenue_data[key]["order_count"] += 1
+    sales = pd.DataFrame(margin_records, columns=[
+        "ShipHead_ShipDate", "ProdGrup_Description", "Calculated_Amount"
+    ])
+    sales = sales.assign(week_start=week_starts(sales["ShipHead_ShipDate"]))
+    sales = sales[sales["week_start"].notna()]
+    prod_groups = sales["ProdGrup_Description"]
+    sales = sales.assign(
+        prod_group=prod_groups.where(is_set(prod_groups), "Other"),
+        outbound=numeric_or_zero(sales["Calculated_Amount"])
+    )
+    revenue_data = sales.groupby(["prod_group", "week_start"], sort=False).agg(
+        outbound=("outbound", "sum"),
+        order_count=("outbound", "size")
+    )
 
     # Create weeks
-    if dates_found:
-        weeks.update(create_weeks_from_data(db, dates_found))
-
-    # Create revenue records
-    created = 0
-    for (prod_group, week_start), data in revenue_data.items():
-        week = weeks.get(week_start)
-        if not week:
+    if not sales.empty:
+        weeks.update(create_weeks_from_data(db, sales["week_start"].unique()))
+
+    # Create revenue records, skipping (week, product) pairs that already
+    # have outbound revenue
+    existing_revenue = set(db.query(FactRevenue.week_id, FactRevenue.product_id).filter(
+        FactRevenue.week_id.in_(set(weeks.values())),
+        FactRevenue.direction == Direction.OUTBOUND
+    ).all())
+    new_revenue = []
+    for (prod_group, week_start), outbound, order_count in zip(
+        revenue_data.index, revenue_data["outbound"], revenue_data["order_count"]
+    ):
+        week_id = weeks.get(week_start)
+        if not week_id:
             continue
 
         # Find or create product
@@ -295,25 +377,21 @@ def load_revenue(db: Session, weeks: dict):
             products[prod_group] = product
 
         # Create outbound revenue
-        existing = db.query(FactRevenue).filter(
-            FactRevenue.week_id == week.week_id,
-            FactRevenue.product_id == product.product_id,
-            FactRevenue.direction == Direction.OUTBOUND
-        ).first()
-
-        if not existing and data["outbound"] > 0:
-            rev = FactRevenue(
-                week_id=week.week_id,
-                product_id=product.product_id,
-                direction=Direction.OUTBOUND,
-                revenue=data["outbound"],
-                order_count=data["order_count"]
-            )
-            db.add(rev)
-            created += 1
-
+        outbound = to_money(outbound)
+        existing = (week_id, product.product_id) in existing_revenue
+
+        if not existing and outbound > 0:
+            new_revenue.append({
+                "week_id": week_id,
+                "product_id": product.product_id,
+                "direction": Direction.OUTBOUND,
+                "revenue": outbound,
+                "order_count": int(order_count)
+            })
+
+    bulk_insert(db, FactRevenue, new_revenue)
     db.commit()
-    print(f"  Created {created} revenue records")
+    print(f"  Created {len(new_revenue)} revenue records")
 
 
 def run_etl():
@@ -328,18 +406,26 @@ def run_etl():
     print("Initializing database...")
     init_db()
 
+    # The three BAQ queries are independent, so they run concurrently;
+    # the database loads below still run one after another
+    print("Querying BAQs...")
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        job_records = pool.submit(fetch_jobs)
+        labor_records = pool.submit(fetch_labor)
+        revenue_records = pool.submit(fetch_revenue)
+
     db = SessionLocal()
     try:
         weeks = {}
 
         # Load jobs first (creates products too)
-        jobs = load_jobs(db)
+        jobs = load_jobs(db, job_records.result())
 
         # Load labor data
-        load_labor(db, jobs, weeks)
+        load_labor(db, jobs, weeks, labor_records.result())
 
         # Load revenue
-        load_revenue(db, weeks)
+        load_revenue(db, weeks, revenue_records.result())
 
         # Summary
         print()
@@ -10,14 +10,18 @@ BAQ Field Mappings:
 - jt_zjobhead01 → Jobs: JobHead_JobNum, JobHead_JobClosed, JobHead_ProdCode, JobHead_PartNum
 - jt_zJobMaterial → Material: JobMtl_JobNum, JobMtl_EstUnitCost, JobMtl_RequiredQty, JobMtl_IssuedQty
 
-Usage: python seed_data.py
+Usage: python seed_data.py  (set SEED=<int> for a different data set)
 """
-import random
+import os
+import itertools
+import numpy as np
 from decimal import Decimal
 from datetime import date, timedelta
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 
-from app.database import SessionLocal, init_db
+from app.database import SessionLocal, engine, init_db
+from app.etl.loader import insert_missing
 from app.models import DimWeek, DimProduct, DimJob, FactRevenue, FactCosts, Direction
 
 # =============================================================================
@@ -48,6 +52,27 @@ PRODUCTS = [
     ("WPS", "Warehouse Manufactured", "Conveyor - Powered", Decimal("0.22")),
 ]
 
+# Default rates from ResourceGroup (if not available in BAQ)
+LABOR_RATE = Decimal("45.00")  # ResourceGroup_ProdLabRate
+BURDEN_RATE = Decimal("28.00")  # ResourceGroup_ProdBurRate
+
+# Weekly revenue by product line (APS typically higher value), as inclusive
+# (inbound low, inbound high, outbound low, outbound high)
+REVENUE_BOUNDS = {
+    "APS": (25000, 150000, 30000, 175000),
+    "IPS": (15000, 80000, 20000, 100000),
+}
+DEFAULT_REVENUE_BOUNDS = (10000, 60000, 12000, 70000)  # WPS
+
+# LaborDtl_LaborHrs - typically 4-60 hours per job per week
+MIN_LABOR_HOURS = 4
+MAX_LABOR_HOURS = 60
+
+# Seed for the sample values; a given SEED always regenerates the same data
+# set. Each phase draws whole NumPy arrays from its own Generator (passed
+# in, no shared global state) spawned from this seed.
+SEED = int(os.environ.get("SEED", 42))
+
 # =============================================================================
 # SAMPLE PART NUMBERS - Mirrors JobHead_PartNum format from jt_zjobhead01
 # =============================================================================
@@ -59,6 +84,9 @@ SAMPLE_PARTS = {
     "Warehouse Manufactured": ["WH-CONV-G", "WH-CONV-P", "WH-CONV-G2", "WH-CONV-P2"],
 }
 
+# Part numbers for product groups not listed above
+DEFAULT_PARTS = ["PART-001"]
+
 
 def create_weeks(db: Session, num_weeks: int = 13) -> list[DimWeek]:
     """Create dimension weeks for the past N weeks.
@@ -70,13 +98,19 @@ def create_weeks(db: Session, num_weeks: int = 13) -> list[DimWeek]:
     today = date.today()
     # Start from Monday of current week
     current_monday = today - timedelta(days=today.weekday())
+    week_starts = [current_monday - timedelta(weeks=i) for i in range(num_weeks)]
+
+    # Existing weeks in one query instead of one lookup per week
+    existing_weeks = {
+        week.week_start: week
+        for week in db.query(DimWeek).filter(DimWeek.week_start.in_(week_starts))
+    }
 
-    for i in range(num_weeks):
-        week_start = current_monday - timedelta(weeks=i)
+    for week_start in week_starts:
         week_end = week_start + timedelta(days=6)
         iso_year, iso_week, _ = week_start.isocalendar()
 
-        existing = db.query(DimWeek).filter(DimWeek.week_start == week_start).first()
+        existing = existing_weeks.get(week_start)
         if existing:
             weeks.append(existing)
         else:
@@ -87,10 +121,9 @@ def create_weeks(db: Session, num_weeks: int = 13) -> list[DimWeek]:
                 iso_week=iso_week
             )
             db.add(week)
-            db.flush()
             weeks.append(week)
 
-    db.commit()
+    db.flush()
     return weeks
 
 
@@ -103,11 +136,11 @@ def create_products(db: Session) -> list[DimProduct]:
     - category = Part.ClassID or custom category
     """
     products = []
+    existing_products = {
+        (product.product_group, product.category): product for product in db.query(DimProduct)
+    }
     for prod_code, prod_group, category, margin in PRODUCTS:
-        existing = db.query(DimProduct).filter(
-            DimProduct.product_group == prod_group,
-            DimProduct.category == category
-        ).first()
+        existing = existing_products.get((prod_group, category))
         if existing:
             products.append(existing)
         else:
@@ -118,14 +151,15 @@ def create_products(db: Session) -> list[DimProduct]:
                 target_margin=margin
             )
             db.add(product)
-            db.flush()
             products.append(product)
 
-    db.commit()
+    db.flush()
     return products
 
 
-def create_jobs(db: Session, products: list[DimProduct], num_jobs: int = 50) -> list[DimJob]:
+def create_jobs(
+    db: Session, products: list[DimProduct], rng: np.random.Generator, num_jobs: int = 50
+) -> list[DimJob]:
     """Create sample jobs linked to products.
 
     Maps to jt_zjobhead01 BAQ:
@@ -138,44 +172,52 @@ def create_jobs(db: Session, products: list[DimProduct], num_jobs: int = 50) ->
     # Job numbers start with 0 or F per Epicor convention
     # 0-prefix for standard jobs, F-prefix for field service jobs
     base_order_num = 85000  # Sales orders
+    existing_jobs = {job.job_num: job for job in db.query(DimJob)}
+
+    # Alternate between 0-prefix and F-prefix jobs (70% standard, 30% field service)
+    standard = rng.random(num_jobs) < 0.70
+    product_idx = rng.integers(len(products), size=num_jobs)
+    # Per-product lookups built once: the ID and the group's realistic part numbers
+    product_ids = [product.product_id for product in products]
+    part_options = [SAMPLE_PARTS.get(product.product_group, DEFAULT_PARTS) for product in products]
+    # Index into the chosen product's part numbers
+    part_counts = np.array([len(options) for options in part_options])
+    part_idx = rng.integers(part_counts[product_idx])
+    # JobHead_JobClosed: FALSE=WIP, TRUE=Completed
+    # Realistic distribution: ~65% WIP, ~35% Completed
+    closed = rng.random(num_jobs) < 0.35
 
     for i in range(num_jobs):
-        # Alternate between 0-prefix and F-prefix jobs (70% standard, 30% field service)
-        if random.random() < 0.70:
+        if standard[i]:
             job_num = f"0{24001 + i}"  # e.g., "024001", "024002"
         else:
             job_num = f"F{24001 + i}"  # e.g., "F24001", "F24002"
 
-        existing = db.query(DimJob).filter(DimJob.job_num == job_num).first()
+        existing = existing_jobs.get(job_num)
         if existing:
             jobs.append(existing)
         else:
-            product = random.choice(products)
-
-            # Get realistic part number for this product group
-            part_options = SAMPLE_PARTS.get(product.product_group, ["PART-001"])
-            part_num = random.choice(part_options)
-
-            # JobHead_JobClosed: FALSE=WIP, TRUE=Completed
-            # Realistic distribution: ~65% WIP, ~35% Completed
-            job_closed = random.random() < 0.35
+            p = product_idx[i]
+            part_num = part_options[p][part_idx[i]]
+            job_closed = bool(closed[i])
 
             job = DimJob(
                 job_num=job_num,  # JobHead_JobNum
                 sales_order_num=str(base_order_num + i),  # OrderHed_OrderNum
                 part_num=part_num,  # JobHead_PartNum
-                product_id=product.product_id,
+                product_id=product_ids[p],
                 job_closed=job_closed  # JobHead_JobClosed
             )
             db.add(job)
-            db.flush()
             jobs.append(job)
 
-    db.commit()
+    db.flush()
     return jobs
 
 
-def create_revenue(db: Session, weeks: list[DimWeek], products: list[DimProduct]):
+def create_revenue(
+    db: Session, weeks: list[DimWeek], products: list[DimProduct], rng: np.random.Generator
+):
     """Create sample revenue facts.
 
     Maps to:
@@ -187,42 +229,47 @@ def create_revenue(db: Session, weeks: list[DimWeek], products: list[DimProduct]
       - Calculated_Cost = cost (for margin calc)
       - ProdGrup_Description = product group
     """
-    for week in weeks:
-        for product in products:
-            # Revenue varies by product line (APS typically higher value)
-            if product.product_line == "APS":
-                base_inbound = random.randint(25000, 150000)
-                base_outbound = random.randint(30000, 175000)
-            elif product.product_line == "IPS":
-                base_inbound = random.randint(15000, 80000)
-                base_outbound = random.randint(20000, 100000)
-            else:  # WPS
-                base_inbound = random.randint(10000, 60000)
-                base_outbound = random.randint(12000, 70000)
-
-            for direction in [Direction.INBOUND, Direction.OUTBOUND]:
-                existing = db.query(FactRevenue).filter(
-                    FactRevenue.week_id == week.week_id,
-                    FactRevenue.product_id == product.product_id,
-                    FactRevenue.direction == direction
-                ).first()
-
-                if not existing:
-                    # Calculated_OpenValue (inbound) or Calculated_Amount (outbound)
-                    revenue = base_inbound if direction == Direction.INBOUND else base_outbound
-                    fact = FactRevenue(
-                        week_id=week.week_id,
-                        product_id=product.product_id,
-                        direction=direction,
-                        revenue=Decimal(str(revenue)),
-                        order_count=random.randint(1, 8)
-                    )
-                    db.add(fact)
-
-    db.commit()
-
-
-def create_costs(db: Session, weeks: list[DimWeek], jobs: list[DimJob], jobs_per_week: int = 40):
+    # Plain keys, read once, so the fact loops don't touch ORM attributes
+    week_ids = [week.week_id for week in weeks]
+    product_ids = [product.product_id for product in products]
+
+    bounds = np.array([
+        REVENUE_BOUNDS.get(product.product_line, DEFAULT_REVENUE_BOUNDS) for product in products
+    ]).reshape(len(products), 4)
+
+    # Every week x product draw at once; [..., 0] inbound, [..., 1] outbound
+    shape = (len(weeks), len(products))
+    base_revenue = np.stack([
+        rng.integers(bounds[:, 0], bounds[:, 1], size=shape, endpoint=True),
+        rng.integers(bounds[:, 2], bounds[:, 3], size=shape, endpoint=True)
+    ], axis=-1)
+    order_counts = rng.integers(1, 8, size=shape + (2,), endpoint=True)
+
+    # Draws flatten in week, product, direction order, matching the keys;
+    # revenue is Calculated_OpenValue (inbound) or Calculated_Amount (outbound)
+    keys = itertools.product(week_ids, product_ids, (Direction.INBOUND, Direction.OUTBOUND))
+    new_facts = (
+        {
+            "week_id": week_id,
+            "product_id": product_id,
+            "direction": direction,
+            "revenue": Decimal(revenue),
+            "order_count": order_count
+        }
+        for (week_id, product_id, direction), revenue, order_count in zip(
+            keys, base_revenue.ravel().tolist(), order_counts.ravel().tolist()
+        )
+    )
+
+    # Batched INSERT ... ON CONFLICT DO NOTHING: facts that already exist
+    # (e.g. on a re-run) are skipped by the unique index, not a pre-check
+    insert_missing(db, FactRevenue, new_facts, ["week_id", "product_id", "direction"])
+
+
+def create_costs(
+    db: Session, weeks: list[DimWeek], jobs: list[DimJob], rng: np.random.Generator,
+    jobs_per_week: int = 40
+):
     """Create sample cost facts.
 
     Maps to jt_zLaborDtl01 BAQ:
@@ -234,48 +281,55 @@ def create_costs(db: Session, weeks: list[DimWeek], jobs: list[DimJob], jobs_per
     Maps to jt_zJobMaterial BAQ:
     - Material cost = JobMtl_EstUnitCost * JobMtl_IssuedQty
     """
-    # Default rates from ResourceGroup (if not available in BAQ)
-    labor_rate = Decimal("45.00")  # ResourceGroup_ProdLabRate
-    burden_rate = Decimal("28.00")  # ResourceGroup_ProdBurRate
-
-    for week in weeks:
-        # Only some jobs have activity each week (realistic)
-        active_jobs = random.sample(jobs, k=min(jobs_per_week, len(jobs)))
-
-        for job in active_jobs:
-            existing = db.query(FactCosts).filter(
-                FactCosts.week_id == week.week_id,
-                FactCosts.job_id == job.job_id
-            ).first()
-
-            if not existing:
-                # LaborDtl_LaborHrs - typically 4-60 hours per job per week
-                labor_hours = Decimal(str(random.randint(4, 60)))
-
-                # LaborDtl_BurdenHrs - usually matches labor hours
-                burden_hours = labor_hours
-
-                # Calculate costs from hours * rates
-                # ResourceGroup_ProdLabRate, ResourceGroup_ProdBurRate
-                direct_labor = labor_hours * labor_rate
-                burden = burden_hours * burden_rate
-
-                # Material cost from jt_zJobMaterial
-                # JobMtl_EstUnitCost * JobMtl_IssuedQty
-                material_cost = Decimal(str(random.randint(200, 8000)))
-
-                fact = FactCosts(
-                    week_id=week.week_id,
-                    job_id=job.job_id,
-                    labor_hours=labor_hours,  # LaborDtl_LaborHrs
-                    burden_hours=burden_hours,  # LaborDtl_BurdenHrs
-                    direct_labor=direct_labor,
-                    burden=burden,
-                    material_cost=material_cost
-                )
-                db.add(fact)
-
-    db.commit()
+    if not jobs:
+        return
+
+    # Plain keys, read once, so the fact loops don't touch ORM attributes
+    week_ids = [week.week_id for week in weeks]
+    job_ids = [job.job_id for job in jobs]
+
+    # Hours and material costs for every active job of every week at once
+    active_count = min(jobs_per_week, len(jobs))
+    shape = (len(weeks), active_count)
+    labor_draws = rng.integers(MIN_LABOR_HOURS, MAX_LABOR_HOURS, size=shape, endpoint=True)
+    # Material cost from jt_zJobMaterial
+    # JobMtl_EstUnitCost * JobMtl_IssuedQty
+    material_draws = rng.integers(200, 8000, size=shape, endpoint=True)
+    # Only some jobs have activity each week (realistic). Every week is
+    # sampled at once: a week's active jobs are the positions of the
+    # active_count smallest values in its row of uniform random keys.
+    sample_keys = rng.random((len(weeks), len(jobs)))
+    active_jobs = np.argpartition(sample_keys, active_count - 1, axis=1)[:, :active_count]
+
+    # Hours take only a few dozen distinct values, so each one's Decimal
+    # hours and hours x rate costs are built once, not per row
+    # (ResourceGroup_ProdLabRate, ResourceGroup_ProdBurRate)
+    hour_costs = {}
+    for hours in range(MIN_LABOR_HOURS, MAX_LABOR_HOURS + 1):
+        labor_hours = Decimal(hours)
+        hour_costs[hours] = {
+            "labor_hours": labor_hours,  # LaborDtl_LaborHrs
+            # LaborDtl_BurdenHrs - usually matches labor hours
+            "burden_hours": labor_hours,
+            "direct_labor": labor_hours * LABOR_RATE,
+            "burden": labor_hours * BURDEN_RATE
+        }
+
+    # One flat sequence of (week, job, hours, material) cells, week by week
+    cells = zip(
+        np.repeat(week_ids, active_count).tolist(),
+        np.asarray(job_ids)[active_jobs].ravel().tolist(),
+        labor_draws.ravel().tolist(),
+        material_draws.ravel().tolist()
+    )
+    new_facts = (
+        {"week_id": week_id, "job_id": job_id, **hour_costs[hours], "material_cost": Decimal(material)}
+        for week_id, job_id, hours, material in cells
+    )
+
+    # Batched INSERT ... ON CONFLICT DO NOTHING, as for revenue (rows are
+    # generated as each batch is sent, so only one batch is held at a time)
+    insert_missing(db, FactCosts, new_facts, ["week_id", "job_id"])
 
 
 def seed_database():
@@ -288,54 +342,87 @@ def seed_database():
     NUM_JOBS = 10000  # ~770 jobs/month, ~35 jobs/day
     JOBS_PER_WEEK = 500  # Active jobs per week (jobs with labor activity)
 
-    db = SessionLocal()
-    try:
-        print(f"Creating weeks ({NUM_WEEKS} weeks = ~13 months)...")
-        weeks = create_weeks(db, num_weeks=NUM_WEEKS)
-        print(f"  Created {len(weeks)} weeks")
-
-        print("Creating products (16 product categories)...")
-        print("  Maps to: Part.ProdCode + ProdGrup_Description")
-        products = create_products(db)
-        print(f"  Created {len(products)} products")
-
-        print(f"Creating jobs ({NUM_JOBS} sample jobs)...")
-        print("  Maps to: jt_zjobhead01 (JobHead_JobNum, JobHead_JobClosed)")
-        jobs = create_jobs(db, products, num_jobs=NUM_JOBS)
-        wip_count = sum(1 for j in jobs if not j.job_closed)
-        completed_count = sum(1 for j in jobs if j.job_closed)
-        print(f"  Created {len(jobs)} jobs ({wip_count} WIP, {completed_count} Completed)")
-
-        print("Creating revenue data...")
-        print("  Maps to: JtecSalesOrderBacklog (inbound), JtecGrossMargin (outbound)")
-        create_revenue(db, weeks, products)
-        revenue_count = db.query(FactRevenue).count()
-        print(f"  Created {revenue_count} revenue records")
-
-        print(f"Creating cost data ({JOBS_PER_WEEK} active jobs/week)...")
-        print("  Maps to: jt_zLaborDtl01 (labor), jt_zJobMaterial (material)")
-        create_costs(db, weeks, jobs, jobs_per_week=JOBS_PER_WEEK)
-        cost_count = db.query(FactCosts).count()
-        print(f"  Created {cost_count} cost records")
-
-        print("\n" + "="*60)
-        print("Sample data seeded successfully!")
-        print("="*60)
-        print(f"\nSummary:")
-        print(f"  Weeks:           {len(weeks)}")
-        print(f"  Products:        {len(products)}")
-        print(f"  Jobs:            {len(jobs)} ({wip_count} WIP / {completed_count} Completed)")
-        print(f"  Revenue records: {revenue_count}")
-        print(f"  Cost records:    {cost_count}")
-        print(f"\nBAQ Mappings Ready:")
-        print(f"  - JtecSalesOrderBacklog → Revenue (inbound)")
-        print(f"  - JtecGrossMargin → Revenue (outbound)")
-        print(f"  - jt_zLaborDtl01 → Labor (with JobAsmbl_JobComplete)")
-        print(f"  - jt_zjobhead01 → Jobs (JobHead_JobClosed)")
-        print(f"  - jt_zJobMaterial → Material costs")
-
-    finally:
-        db.close()
+    # Independent, reproducible random streams per phase
+    job_rng, revenue_rng, cost_rng = (
+        np.random.default_rng(seed) for seed in np.random.SeedSequence(SEED).spawn(3)
+    )
+
+    # The seed runs on its own connection so the relaxed SQLite settings
+    # below can be restored before the connection returns to the pool
+    with engine.connect() as connection:
+        relax_durability = connection.dialect.name == "sqlite"
+        if relax_durability:
+            # Sample data needs no durability: skip fsyncs and give the bulk
+            # inserts a bigger page cache (the engine already sets WAL and
+            # temp_store=MEMORY)
+            connection.exec_driver_sql("PRAGMA synchronous=OFF")
+            connection.exec_driver_sql("PRAGMA cache_size=-262144")  # 256 MB
+            connection.commit()
+
+        try:
+            # One transaction for the whole seed, committed when the block
+            # exits (the create_* functions only flush where later steps need
+            # keys). SessionLocal already disables autoflush; nothing is read
+            # after the commit, so expiring every seeded object on it would
+            # be wasted work.
+            with SessionLocal(bind=connection, expire_on_commit=False) as db, db.begin():
+                print(f"Creating weeks ({NUM_WEEKS} weeks = ~13 months)...")
+                weeks = create_weeks(db, num_weeks=NUM_WEEKS)
+                print(f"  Created {len(weeks)} weeks")
+
+                print("Creating products (16 product categories)...")
+                print("  Maps to: Part.ProdCode + ProdGrup_Description")
+                products = create_products(db)
+                print(f"  Created {len(products)} products")
+
+                print(f"Creating jobs ({NUM_JOBS} sample jobs)...")
+                print("  Maps to: jt_zjobhead01 (JobHead_JobNum, JobHead_JobClosed)")
+                jobs = create_jobs(db, products, job_rng, num_jobs=NUM_JOBS)
+                completed_count = sum(j.job_closed for j in jobs)
+                wip_count = len(jobs) - completed_count
+                print(f"  Created {len(jobs)} jobs ({wip_count} WIP, {completed_count} Completed)")
+
+                # The fact phases only read keys already loaded on these objects, so
+                # stop tracking them rather than carry ~10k instances in the session
+                db.expunge_all()
+
+                print("Creating revenue data...")
+                print("  Maps to: JtecSalesOrderBacklog (inbound), JtecGrossMargin (outbound)")
+                create_revenue(db, weeks, products, revenue_rng)
+
+                print(f"Creating cost data ({JOBS_PER_WEEK} active jobs/week)...")
+                print("  Maps to: jt_zLaborDtl01 (labor), jt_zJobMaterial (material)")
+                create_costs(db, weeks, jobs, cost_rng, jobs_per_week=JOBS_PER_WEEK)
+
+                # Both fact counts in one round trip
+                revenue_count, cost_count = db.execute(select(
+                    select(func.count()).select_from(FactRevenue).scalar_subquery(),
+                    select(func.count()).select_from(FactCosts).scalar_subquery()
+                )).one()
+                print(f"  Created {revenue_count} revenue records and {cost_count} cost records")
+        finally:
+            if relax_durability:
+                # Back to the engine's connect-time settings
+                # (app.database.set_sqlite_pragmas)
+                connection.exec_driver_sql("PRAGMA synchronous=NORMAL")
+                connection.exec_driver_sql("PRAGMA cache_size=-65536")
+                connection.commit()
+
+    print("\n" + "="*60)
+    print("Sample data seeded successfully!")
+    print("="*60)
+    print(f"\nSummary:")
+    print(f"  Weeks:           {len(weeks)}")
+    print(f"  Products:        {len(products)}")
+    print(f"  Jobs:            {len(jobs)} ({wip_count} WIP / {completed_count} Completed)")
+    print(f"  Revenue records: {revenue_count}")
+    print(f"  Cost records:    {cost_count}")
+    print(f"\nBAQ Mappings Ready:")
+    print(f"  - JtecSalesOrderBacklog → Revenue (inbound)")
+    print(f"  - JtecGrossMargin → Revenue (outbound)")
+    print(f"  - jt_zLaborDtl01 → Labor (with JobAsmbl_JobComplete)")
+    print(f"  - jt_zjobhead01 → Jobs (JobHead_JobClosed)")
+    print(f"  - jt_zJobMaterial → Material costs")
 
 
 if __name__ == "__main__":